@@ -0,0 +1,93 @@
+import argparse
+import json
+import sys
+import tempfile
+from pathlib import Path
+
+from benchmark.suite import (
+    check_scaling,
+    compare_baseline,
+    format_results,
+    measure_import,
+    run_case,
+)
+
+DEFAULT_BASELINE = Path(__file__).parent / "baseline.json"
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Benchmark the converter on synthetic packages")
+
+    parser.add_argument("--sections", type=int, default=4, help="Section files of the base size")
+    parser.add_argument("--commands", type=int, default=50, help="Commands per section file")
+    parser.add_argument(
+        "--scales",
+        type=str,
+        default="1,2,4,8",
+        help="Comma separated factors the number of commands is scaled with",
+    )
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per measurement")
+    parser.add_argument(
+        "--baseline", type=Path, default=DEFAULT_BASELINE, help="Stored baseline results"
+    )
+    parser.add_argument(
+        "--save-baseline", action="store_true", help="Store the results as new baseline"
+    )
+    parser.add_argument(
+        "--no-baseline",
+        action="store_true",
+        help="Only check the scaling, e.g. on a machine without a baseline",
+    )
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.25,
+        help="Allowed relative slowdown against the baseline",
+    )
+    parser.add_argument(
+        "--max-exponent",
+        type=float,
+        default=1.2,
+        help="Largest allowed exponent k of time ~ commands^k",
+    )
+    parser.add_argument("--output", type=Path, default=None, help="Write the results as JSON")
+
+    args = parser.parse_args()
+    scales = [int(scale) for scale in args.scales.split(",")]
+
+    results = []
+    with tempfile.TemporaryDirectory() as work_dir:
+        for scale in scales:
+            results.append(
+                run_case(Path(work_dir), args.sections, args.commands * scale, args.repeat)
+            )
+    print(format_results(results))
+    import_result = measure_import("core.api", args.repeat)
+    print(f"Import of {import_result['module']}: {import_result['duration'] * 1000:.1f} ms")
+
+    if args.output is not None:
+        args.output.write_text(json.dumps(results, indent=2), encoding="utf-8")
+
+    failures = check_scaling(results, args.max_exponent)
+    if import_result["gui_modules"]:
+        failures.append(f"core.api imports {', '.join(import_result['gui_modules'])}")
+    if args.save_baseline:
+        args.baseline.write_text(json.dumps(results, indent=2), encoding="utf-8")
+        print(f"Saved baseline to {args.baseline}.")
+    elif args.baseline.exists() and not args.no_baseline:
+        baseline = json.loads(args.baseline.read_text(encoding="utf-8"))
+        failures += compare_baseline(results, baseline, args.tolerance)
+    elif not args.no_baseline:
+        # Timings depend on the machine, so there is no baseline to fall back to
+        failures.append(
+            f"no baseline at {args.baseline}, create one with --save-baseline "
+            "or skip the comparison with --no-baseline"
+        )
+
+    for failure in failures:
+        print(f"FAIL {failure}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,95 @@
+import random
+from pathlib import Path
+
+ARG_TYPES = ["vector", "vectors", "matrix", "matrices", "scalar", "angle"]
+
+
+def generate_corpus(rsc_dir: Path, sections: int, commands: int, seed: int = 0) -> int:
+    """
+    Write a synthetic resource directory with the given number of section files, each
+    containing the given number of commands. Returns the total number of lines written.
+    """
+    rng = random.Random(seed)
+    docu_dir = rsc_dir / "docu"
+    docu_dir.mkdir(parents=True, exist_ok=True)
+
+    (rsc_dir / "package_config.txt").write_text(
+        "pkg_name=benchpkg\n"
+        "pkg_description=Synthetic benchmark package\n"
+        "pkg_author=Bench Author\n"
+        "pkg_author_email=bench@example.com\n"
+        "pkg_date=2024/01/01\n"
+        "pkg_version=1.0\n"
+        "pkg_info_text=Benchmark\n",
+        encoding="utf-8",
+    )
+    (docu_dir / "pkg_packages.tex").write_text(
+        "\\RequirePackage{xparse}\n\\RequirePackage{amsmath}\n", encoding="utf-8"
+    )
+    (docu_dir / "docu_packages_and_settings.tex").write_text(
+        "\\usepackage{tcolorbox}\n\\usepackage{makecell}\n\\usepackage{tabularx}\n",
+        encoding="utf-8",
+    )
+    (docu_dir / "introduction.tex").write_text(
+        "\\section{Introduction}\nA synthetic package for benchmarks.\n", encoding="utf-8"
+    )
+    (docu_dir / "example.tex").write_text(
+        "\\section{Example}\nUse \\cmdAA to do something.\n", encoding="utf-8"
+    )
+
+    line_count = 0
+    for section_idx in range(sections):
+        lines = [f"%% Section {section_idx}\n", "%%\n", "\n"]
+        for command_idx in range(commands):
+            lines += _generate_command(rng, f"cmd{_letters(section_idx)}{_letters(command_idx)}")
+        file_path = rsc_dir / f"{section_idx:03d}_Section{_letters(section_idx)}.tex"
+        file_path.write_text("".join(lines), encoding="utf-8")
+        line_count += len(lines)
+
+    return line_count
+
+
+def _generate_command(rng: random.Random, name: str) -> list[str]:
+    arg_count = rng.randint(0, 4)
+    has_oarg = arg_count > 0 and rng.random() < 0.3
+
+    lines = []
+    if rng.random() < 0.1:
+        lines.append("% Private\n")
+    for _ in range(rng.randint(1, 3)):
+        lines.append(f"% Description of {name} using #{rng.randint(1, max(arg_count, 1))}.\n")
+    for arg_idx in range(1, arg_count + 1):
+        arg_type = rng.choice(ARG_TYPES)
+        lines.append(f"% #{arg_idx} {arg_type} a{arg_idx}, the {arg_type} number {arg_idx}\n")
+    if arg_count > 0 and rng.random() < 0.5:
+        lines.append(f"% Equation: #1 = {' + '.join(f'#{i}' for i in range(1, arg_count + 1))}\n")
+    if rng.random() < 0.5:
+        lines.append(f"% Example: \\{name}{{x}}\n")
+    if rng.random() < 0.2:
+        lines.append(f"% Error: fails for empty input of \\{name}\n")
+    if rng.random() < 0.1:
+        lines.append(f"% TODO improve {name}\n")
+
+    if has_oarg:
+        lines.append(f"\\newcommand\\{name}[{arg_count}][0]{{%\n")
+    elif arg_count > 0:
+        lines.append(f"\\newcommand\\{name}[{arg_count}]{{%\n")
+    else:
+        lines.append(f"\\newcommand\\{name}{{%\n")
+    for _ in range(rng.randint(1, 6)):
+        lines.append(
+            f"    \\ensuremath{{{' '.join(f'#{i}' for i in range(1, arg_count + 1))}}}%\n"
+        )
+    lines.append("}\n")
+    lines.append("\n")
+    return lines
+
+
+def _letters(idx: int) -> str:
+    """Command names may only contain letters, so numbers are written as letters."""
+    result = ""
+    while True:
+        result = chr(ord("A") + idx % 26) + result
+        idx = idx // 26 - 1
+        if idx < 0:
+            return result
@@ -0,0 +1,219 @@
+import contextlib
+import math
+import os
+import subprocess
+import sys
+import time
+import tracemalloc
+from collections.abc import Callable
+from pathlib import Path
+from typing import Any, TypedDict
+
+from benchmark.corpus import generate_corpus
+from core.converter import Converter
+from core.ir import command_ir
+from core.writer import DtxWriter
+from meta_information import MetaInformation
+
+STAGES = ["parse_tex", "parse_command", "tex_to_dtx", "add_header", "execute"]
+# Stages whose work does not depend on the number of commands
+CONSTANT_STAGES = {"add_header"}
+# Modules the core must not import, so it can be embedded without a display
+GUI_MODULES = ("tkinter", "idlelib", "gui")
+
+
+class CaseResult(TypedDict):
+    sections: int
+    commands: int
+    lines: int
+    timings: dict[str, float]
+    lines_per_s: float
+    commands_per_s: float
+    peak_memory: int
+    parsed_memory: int
+
+
+class ImportResult(TypedDict):
+    module: str
+    duration: float
+    gui_modules: list[str]
+
+
+def measure_import(module: str, repeat: int) -> ImportResult:
+    """Time importing the module in a fresh interpreter and find the GUI modules it imports."""
+    src_dir = Path(__file__).parent.parent
+    best = math.inf
+    gui_modules: set[str] = set()
+    for _ in range(repeat):
+        process = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+            cwd=src_dir,
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+        # Lines of -X importtime: "import time: self [us] | cumulative | imported package"
+        for line in process.stderr.splitlines():
+            fields = line.split("|")
+            if len(fields) != 3 or not fields[1].strip().isdigit():
+                continue
+            name = fields[2].strip()
+            if name.split(".")[0] in GUI_MODULES:
+                gui_modules.add(name)
+            if name == module:
+                best = min(best, int(fields[1]) / 1_000_000)
+    return {"module": module, "duration": best, "gui_modules": sorted(gui_modules)}
+
+
+def run_case(work_dir: Path, sections: int, commands: int, repeat: int) -> CaseResult:
+    """Generate a corpus of the given size and time all stages of the conversion on it."""
+    rsc_dir = work_dir / f"rsc_{sections}x{commands}"
+    tgt_dir = work_dir / f"tgt_{sections}x{commands}"
+    tgt_dir.mkdir(parents=True, exist_ok=True)
+    line_count = generate_corpus(rsc_dir, sections, commands)
+
+    meta_info = MetaInformation()
+    meta_info.set_dirs(rsc_dir, tgt_dir)
+    meta_info.set_cache(False)
+    converter = Converter(meta_info)
+    converter._load_package_metainfo(rsc_dir)
+
+    section_files = sorted(rsc_dir.glob("*.tex"))
+    timings: dict[str, float] = {}
+    with _quiet():
+        timings["parse_tex"] = _measure(
+            lambda: [converter._parse_tex(f) for f in section_files], repeat
+        )
+
+        parsed = {f.stem: converter._parse_tex(f) for f in section_files}
+        command_objs = [obj for objs in parsed.values() for obj in objs if obj.o_type == "command"]
+        parsed_commands = [obj.o_command for obj in command_objs if obj.o_command is not None]
+        timings["parse_command"] = _measure(
+            lambda: [converter._render_command(command_ir(cmd)) for cmd in parsed_commands],
+            repeat,
+        )
+
+        def tex_to_dtx():
+            sections_iter = (
+                (key, *converter._section_to_dtx(key, objs)) for key, objs in parsed.items()
+            )
+            with DtxWriter(tgt_dir / "bench.dtx") as writer:
+                converter._tex_to_dtx(rsc_dir / "docu", sections_iter, writer)
+
+        timings["tex_to_dtx"] = _measure(tex_to_dtx, repeat)
+        timings["add_header"] = _measure(lambda: converter._add_header(rsc_dir / "docu"), repeat)
+        timings["execute"] = _measure(lambda: Converter(meta_info).execute(), repeat)
+
+        tracemalloc.start()
+        Converter(meta_info).execute()
+        _, peak_memory = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        # Memory held by the parsed objects of all section files, including their lines
+        tracemalloc.start()
+        parsed_again = [converter._parse_tex(f) for f in section_files]
+        parsed_memory, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        del parsed_again
+
+    return {
+        "sections": sections,
+        "commands": commands,
+        "lines": line_count,
+        "timings": timings,
+        "lines_per_s": line_count / timings["parse_tex"],
+        "commands_per_s": len(command_objs) / timings["execute"],
+        "peak_memory": peak_memory,
+        "parsed_memory": parsed_memory,
+    }
+
+
+def compare_baseline(
+    results: list[CaseResult], baseline: list[dict[str, Any]], tolerance: float
+) -> list[str]:
+    """Return a message for every stage that got slower or needs more memory than allowed."""
+    failures = []
+    base_cases = {(case["sections"], case["commands"]): case for case in baseline}
+    for result in results:
+        base = base_cases.get((result["sections"], result["commands"]))
+        if base is None:
+            continue
+
+        size = f"{result['sections']}x{result['commands']}"
+        for stage, duration in result["timings"].items():
+            base_duration = base["timings"].get(stage)
+            if base_duration and duration > base_duration * (1 + tolerance):
+                failures.append(
+                    f"{size} {stage}: {duration * 1000:.1f} ms, "
+                    f"baseline {base_duration * 1000:.1f} ms"
+                )
+        for label, memory, base_memory in [
+            ("peak memory", result["peak_memory"], base.get("peak_memory")),
+            ("parsed memory", result["parsed_memory"], base.get("parsed_memory")),
+        ]:
+            if base_memory and memory > base_memory * (1 + tolerance):
+                failures.append(
+                    f"{size} {label}: {memory / 1024 / 1024:.1f} MB, "
+                    f"baseline {base_memory / 1024 / 1024:.1f} MB"
+                )
+    return failures
+
+
+def check_scaling(results: list[CaseResult], max_exponent: float) -> list[str]:
+    """
+    Fit the exponent k of time ~ commands^k for every stage and report stages that
+    scale worse than the given exponent.
+    """
+    if len(results) < 2:
+        return []
+
+    failures = []
+    sizes = [math.log(result["sections"] * result["commands"]) for result in results]
+    for stage in STAGES:
+        if stage in CONSTANT_STAGES:
+            continue
+        durations = [math.log(result["timings"][stage]) for result in results]
+        exponent = _slope(sizes, durations)
+        if exponent > max_exponent:
+            failures.append(f"{stage} scales with exponent {exponent:.2f} > {max_exponent}")
+    return failures
+
+
+def format_results(results: list[CaseResult]) -> str:
+    header = f"{'size':>10} {'lines':>8}" + "".join(f" {stage:>14}" for stage in STAGES)
+    header += f" {'lines/s':>10} {'cmds/s':>10} {'peak MB':>8} {'parsed MB':>9}"
+    rows = [header]
+    for result in results:
+        row = f"{result['sections']}x{result['commands']:<6}".rjust(10)
+        row += f" {result['lines']:>8}"
+        row += "".join(f" {result['timings'][stage] * 1000:>11.2f} ms" for stage in STAGES)
+        row += f" {result['lines_per_s']:>10.0f} {result['commands_per_s']:>10.0f}"
+        row += f" {result['peak_memory'] / 1024 / 1024:>8.2f}"
+        row += f" {result['parsed_memory'] / 1024 / 1024:>9.2f}"
+        rows.append(row)
+    return "\n".join(rows)
+
+
+def _measure(func: Callable[[], object], repeat: int) -> float:
+    """Return the fastest of the given number of runs in seconds."""
+    best = math.inf
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def _slope(xs: list[float], ys: list[float]) -> float:
+    mean_x = sum(xs) / len(xs)
+    mean_y = sum(ys) / len(ys)
+    numerator = sum((x - mean_x) * (y - mean_y) for x, y in zip(xs, ys))
+    denominator = sum((x - mean_x) ** 2 for x in xs)
+    return numerator / denominator
+
+
+@contextlib.contextmanager
+def _quiet():
+    """Silence the console output of the converter while measuring."""
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        yield
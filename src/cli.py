@@ -1,14 +1,313 @@
+import contextlib
+import json
+import sys
+import threading
+import time
+from concurrent.futures import Executor
 from pathlib import Path
+from typing import TypedDict
 
-from core.converter import Converter
+from core.api import convert_section
+from core.cancel import ConversionCancelled
+from core.converter import TEMPLATE_PATH, Converter, worker_pool
+from core.diagnostics import Diagnostics
+from core.progress import ProgressState
+from core.symbols import SYMBOL_INDEX_NAME, SymbolIndex
+from core.watcher import DirectoryWatcher
 from meta_information import MetaInformation
 
+# Seconds between two redraws of the progress line
+PROGRESS_INTERVAL = 0.1
+
 
 class CliApp:
-    def __init__(self, rsc_dir: Path, tgt_dir: Path):
-        self.meta_info = MetaInformation()
-        self.meta_info.set_dirs(rsc_dir, tgt_dir)
+    def __init__(
+        self,
+        meta_info: MetaInformation,
+        *,
+        profile: None | Path = None,
+        update: bool = False,
+        diagnostics: None | Path = None,
+    ):
+        self.meta_info = meta_info
+        # Only draw a progress line if somebody is watching
+        self.meta_info.set_progress(sys.stderr.isatty())
+        # File the spans of the enabled profiler are saved to
+        self.profile = profile
+        # Splice the changed sections into the existing dtx instead of writing all of it
+        self.update = update
+        # JSON file the diagnostics of every run are exported to
+        self.diagnostics = diagnostics
 
-    def run(self):
+    def run(self) -> bool:
+        """Convert the package, returns whether the conversion finished within its limits."""
         converter = Converter(self.meta_info)
-        converter.execute()
+        try:
+            self.execute(converter)
+        except ConversionCancelled as e:
+            print(f"Conversion cancelled: {e}")
+            return False
+        finally:
+            self.export_diagnostics()
+        self.report_profile()
+        return True
+
+    def check(self) -> bool:
+        """Validate the sections without converting them, returns whether there are no errors."""
+        try:
+            return Converter(self.meta_info).check()
+        except ConversionCancelled as e:
+            print(f"Check cancelled: {e}")
+            return False
+        finally:
+            self.export_diagnostics()
+
+    def export_diagnostics(self):
+        if self.diagnostics is None:
+            return
+
+        self.meta_info.diagnostics.export_json(self.diagnostics)
+        print(f"Saved diagnostics to {self.diagnostics}.")
+
+    def execute(self, converter: Converter):
+        """Run the converter, drawing its progress events as one line on stderr."""
+        if self.meta_info.progress is None:
+            converter.execute(self.update)
+            return
+
+        printer = threading.Thread(target=self.print_progress, daemon=True)
+        printer.start()
+        try:
+            converter.execute(self.update)
+        finally:
+            printer.join()
+
+    def print_progress(self):
+        progress = self.meta_info.progress
+        if progress is None:
+            return
+
+        state = ProgressState()
+        last_print = 0.0
+        while not state.finished:
+            event = progress.get()
+            if event is None:
+                continue
+            state.update(event)
+            now = time.perf_counter()
+            if now - last_print >= PROGRESS_INTERVAL or state.finished:
+                sys.stderr.write(f"\r{state.format()}\033[K")
+                sys.stderr.flush()
+                last_print = now
+        sys.stderr.write("\n")
+
+    def report_profile(self):
+        """Print the stage breakdown and export all spans as Chrome trace."""
+        if self.profile is None:
+            return
+
+        print(f"Stages: {self.meta_info.profiler.stage_summary()}")
+        self.meta_info.profiler.export_chrome_trace(self.profile)
+        print(f"Saved profile to {self.profile}.")
+
+    def open_symbol_index(self) -> None | SymbolIndex:
+        db_path = self.meta_info.tgt_dir / SYMBOL_INDEX_NAME
+        if db_path.exists():
+            index = SymbolIndex(db_path)
+            if index.is_current():
+                return index
+            index.close()
+        print(f"No symbol index found in {self.meta_info.tgt_dir}, convert the package first.")
+        return None
+
+    def lookup(self, name: str) -> bool:
+        """Print all definitions of the given macro, returns whether it was found."""
+        index = self.open_symbol_index()
+        if index is None:
+            return False
+
+        with index:
+            macros = index.lookup(name)
+        for macro in macros:
+            details = f"\\{macro['name']}{macro['signature']}"
+            if macro["oarg_default"] is not None:
+                details += f", default: {macro['oarg_default']}"
+            if macro["private"]:
+                details += ", private"
+            print(f"{macro['file']}:{macro['line']}: {details} (section {macro['section']})")
+        if len(macros) == 0:
+            print(f"Macro {name} is not defined.")
+        return len(macros) > 0
+
+    def check_refs(self) -> bool:
+        """Print duplicate macros and dangling references, returns whether there are none."""
+        index = self.open_symbol_index()
+        if index is None:
+            return False
+
+        start = time.perf_counter()
+        with index:
+            duplicates = index.duplicates()
+            dangling = index.dangling()
+            macro_count, ref_count = index.counts()
+        duration = (time.perf_counter() - start) * 1000
+
+        for macro in duplicates:
+            print(f"{macro['file']}:{macro['line']}: Duplicate macro \\{macro['name']}.")
+        for ref in dangling:
+            print(f"{ref['file']}:{ref['line']}: Dangling reference to macro:{ref['label']}.")
+        print(
+            f"Checked {macro_count} macros and {ref_count} references in {duration:.1f} ms, "
+            f"{len(duplicates)} duplicate definitions, {len(dangling)} dangling references."
+        )
+        return len(duplicates) == 0 and len(dangling) == 0
+
+    def watch(self):
+        """Convert once and regenerate the dtx whenever a resource file or template changes."""
+        converter = Converter(self.meta_info, resident=True)
+        self.execute(converter)
+        self.report_profile()
+
+        rsc_dir = self.meta_info.rsc_dir
+        watcher = DirectoryWatcher(
+            rsc_dir,
+            include=self.meta_info.include,
+            exclude=self.meta_info.exclude,
+            ignore=[self.meta_info.tgt_dir],
+            dirs=[rsc_dir / "docu", TEMPLATE_PATH],
+            files=[rsc_dir / "package_config.txt"],
+        )
+        print("Watching for changes, press Ctrl+C to stop.")
+        try:
+            while True:
+                changed = watcher.wait_for_change()
+                start = time.perf_counter()
+                try:
+                    self.execute(converter)
+                except Exception as e:
+                    print(f"Conversion failed: {e}")
+                    continue
+                latency = (time.perf_counter() - start) * 1000
+                print(f"Regenerated after {len(changed)} changed file(s) in {latency:.1f} ms.")
+                self.report_profile()
+        except KeyboardInterrupt:
+            print("Stopped watching.")
+
+
+def convert_stdin(section_name: str):
+    """Convert one section file read from stdin and write its fragments to stdout."""
+    text = sys.stdin.buffer.read().decode("utf-8")
+    diagnostics = Diagnostics()
+    # Messages of the converter must not end up in the converted output
+    with contextlib.redirect_stdout(sys.stderr):
+        docu, impl = convert_section(section_name, text, diagnostics)
+    sys.stderr.write(diagnostics.format())
+    sys.stdout.buffer.write(docu.encode("utf-8"))
+    sys.stdout.buffer.write(impl.encode("utf-8"))
+    sys.stdout.flush()
+
+
+class PackageResult(TypedDict):
+    name: str
+    duration: float
+    commands: int
+    size: int
+    rewritten: bool
+    error: None | str
+
+
+class BatchApp:
+    """
+    Converts many packages in one process. Templates and compiled patterns are cached on
+    module level and therefore shared, the worker pool is created once for all packages.
+    """
+
+    def __init__(self, batch: Path, meta_info: MetaInformation):
+        """
+        The settings of the meta information apply to every package, its limits to every
+        single one. Its target dir is the parent of the package targets of a directory batch.
+        """
+        self.packages = self.load_packages(batch, meta_info.tgt_dir)
+        self.meta_info = meta_info
+        self.jobs = meta_info.jobs
+
+    @staticmethod
+    def load_packages(batch: Path, tgt_dir: Path) -> list[tuple[Path, Path]]:
+        """
+        Read the resource and target directory pairs of all packages. Either from a JSON
+        manifest with a list of objects with "resource_dir" and "target_dir", where relative
+        paths are resolved against the manifest, or from all subdirectories of a parent
+        directory that contain a package_config.txt, which are converted into
+        subdirectories of the given target directory.
+        """
+        if batch.is_dir():
+            return [
+                (rsc_dir, tgt_dir / rsc_dir.name)
+                for rsc_dir in sorted(batch.iterdir())
+                if (rsc_dir / "package_config.txt").is_file()
+            ]
+
+        with open(batch, encoding="utf-8") as f:
+            manifest = json.load(f)
+        return [
+            (batch.parent / entry["resource_dir"], batch.parent / entry["target_dir"])
+            for entry in manifest
+        ]
+
+    def run(self) -> bool:
+        """Convert all packages and print a summary, returns whether all succeeded."""
+        if self.jobs > 1:
+            with worker_pool(self.jobs, self.meta_info.cancel) as executor:
+                results = [self.convert(*package, executor) for package in self.packages]
+        else:
+            results = [self.convert(*package) for package in self.packages]
+
+        print(self.format_summary(results))
+        return all(result["error"] is None for result in results)
+
+    def convert(
+        self, rsc_dir: Path, tgt_dir: Path, executor: None | Executor = None
+    ) -> PackageResult:
+        meta_info = self.meta_info.for_package(rsc_dir, tgt_dir)
+        cancel = self.meta_info.cancel
+        if executor is not None and cancel is not None and meta_info.cancel is not None:
+            # The workers only see the event they were started with, the packages are
+            # converted one after another and a stopped conversion waits for its running
+            # sections, so they can share it
+            meta_info.cancel.event = cancel.event
+
+        start = time.perf_counter()
+        error = None
+        try:
+            tgt_dir.mkdir(parents=True, exist_ok=True)
+            Converter(meta_info, executor=executor).execute()
+        except Exception as e:
+            error = str(e)
+            print(f"Conversion of {rsc_dir} failed: {e}")
+
+        output_file = meta_info.output_file
+        return {
+            "name": rsc_dir.name,
+            "duration": time.perf_counter() - start,
+            "commands": meta_info.command_count,
+            "size": output_file.stat().st_size if error is None and output_file else 0,
+            "rewritten": meta_info.output_rewritten,
+            "error": error,
+        }
+
+    @staticmethod
+    def format_summary(results: list[PackageResult]) -> str:
+        width = max([len(result["name"]) for result in results] + [len("package")])
+        rows = [f"{'package':<{width}} {'time':>10} {'commands':>9} {'size':>10}  status"]
+        for result in results:
+            if result["error"] is not None:
+                status = f"failed: {result['error']}"
+            else:
+                status = "ok" if result["rewritten"] else "ok, unchanged"
+            rows.append(
+                f"{result['name']:<{width}} {result['duration'] * 1000:>7.1f} ms"
+                f" {result['commands']:>9} {result['size'] / 1024:>7.1f} KB  {status}"
+            )
+        failed = sum(1 for result in results if result["error"] is not None)
+        rows.append(f"{len(results)} package(s), {failed} failed.")
+        return "\n".join(rows)
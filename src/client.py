@@ -0,0 +1,115 @@
+import json
+import socket
+import sys
+import time
+from pathlib import Path
+from typing import Any
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 48765
+# Holds the default socket and the tokens of the TCP servers, only accessible by the user
+SERVER_DIR = Path.home() / ".tex2dtx"
+DEFAULT_SOCKET = SERVER_DIR / "server.sock"
+
+# Path of a Unix socket or host and port of a TCP socket
+ServerAddress = str | tuple[str, int]
+
+
+def server_address(port: None | int = None, socket_path: None | Path = None) -> ServerAddress:
+    """
+    The given Unix socket or localhost port. Without either the default socket is used where
+    Unix sockets are available, otherwise the default port.
+    """
+    if socket_path is not None:
+        return str(socket_path)
+    if port is None and hasattr(socket, "AF_UNIX"):
+        return str(DEFAULT_SOCKET)
+    return (DEFAULT_HOST, DEFAULT_PORT if port is None else port)
+
+
+def token_path(address: tuple[str, int]) -> Path:
+    """File with the token a TCP server requires in every request."""
+    return SERVER_DIR / f"server-{address[1]}.token"
+
+
+def format_address(address: ServerAddress) -> str:
+    return address if isinstance(address, str) else f"{address[0]}:{address[1]}"
+
+
+class ServerClient:
+    """
+    Thin client of the conversion server. Requests and responses are JSON objects, one per
+    line. Only the standard library is imported, so the client starts quickly.
+    """
+
+    def __init__(self, address: ServerAddress):
+        # Every local user can connect to a port, so only requests with the token of the
+        # server that only the user can read are handled
+        self.token: None | str = None
+        if not isinstance(address, str):
+            self.token = token_path(address).read_text(encoding="utf-8").strip()
+        family = socket.AF_UNIX if isinstance(address, str) else socket.AF_INET
+        self.socket = socket.socket(family, socket.SOCK_STREAM)
+        try:
+            self.socket.connect(address)
+        except OSError:
+            self.socket.close()
+            raise
+        self.file = self.socket.makefile("rwb")
+
+    def __enter__(self) -> "ServerClient":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        self.file.close()
+        self.socket.close()
+
+    def request(self, request: dict[str, Any]) -> dict[str, Any]:
+        if self.token is not None:
+            request = {**request, "token": self.token}
+        self.file.write(json.dumps(request).encode("utf-8") + b"\n")
+        self.file.flush()
+        line = self.file.readline()
+        if not line:
+            raise ConnectionError("The server closed the connection.")
+        return json.loads(line)
+
+
+def run_client(address: ServerAddress, request: dict[str, Any]) -> bool:
+    """Send one request to the server and print its result, returns whether it succeeded."""
+    start = time.perf_counter()
+    try:
+        with ServerClient(address) as client:
+            response = client.request(request)
+    except (ConnectionRefusedError, FileNotFoundError):
+        print(f"No conversion server is running at {format_address(address)}.")
+        return False
+    latency = (time.perf_counter() - start) * 1000
+
+    if response.get("error") is not None:
+        print(f"Request failed: {response['error']}")
+        return False
+
+    if request["command"] == "convert":
+        state = "rewritten" if response["rewritten"] else "unchanged"
+        print(
+            f"{response['output_file']} {state}, {response['commands']} commands, "
+            f"{response['cache_hits']} cache hits, {response['cache_misses']} misses."
+        )
+    elif request["command"] == "render":
+        # The fragments go to stdout so they can be piped, the timing to stderr
+        sys.stdout.write(response["docu"])
+        sys.stdout.write(response["impl"])
+        sys.stdout.flush()
+    elif request["command"] == "shutdown":
+        print("Stopped the conversion server.")
+        return True
+
+    print(
+        f"Server time {response['duration'] * 1000:.1f} ms, round trip {latency:.1f} ms.",
+        file=sys.stderr if request["command"] == "render" else sys.stdout,
+    )
+    return True
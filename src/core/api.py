@@ -0,0 +1,77 @@
+from collections.abc import Iterator, Mapping
+from pathlib import Path
+
+from core.converter import HEADER_RESOURCES, Converter
+from core.diagnostics import Diagnostics
+from core.writer import Chunk, MemoryWriter, chunk_text
+from meta_information import MetaInformation
+
+# Directory the resources are looked up in, it does not exist on disk
+MEMORY_DIR = Path("<memory>")
+
+
+def convert_section(
+    section_name: str, text: str, diagnostics: None | Diagnostics = None
+) -> tuple[str, str]:
+    """
+    Convert the text of one section file, returns its documentation and implementation.
+    The problems found are added to the given diagnostics, nothing is printed.
+    """
+    converter = Converter(_meta_info(diagnostics))
+    fragments = converter.convert_text(section_name, text)
+    converter.meta_info.diagnostics.extend(fragments["diagnostics"])
+    return chunk_text(fragments["docu"]), chunk_text(fragments["impl"])
+
+
+def iter_dtx(
+    sections: Mapping[str, str],
+    resources: None | Mapping[str, str] = None,
+    config: None | Mapping[str, str] = None,
+    diagnostics: None | Diagnostics = None,
+) -> Iterator[str]:
+    """
+    Convert a package in memory and yield the chunks of its dtx file. Nothing is read from or
+    written to a resource or target dir, only the templates are read from the installation.
+
+    sections maps the section names to the text of their files, in the order of the dtx.
+    resources maps the file names of the docu resources (e.g. "introduction.tex") to their
+    text and config holds the keys of a package_config.txt, missing values are defaults.
+    The problems found are added to the given diagnostics, nothing is printed.
+    """
+    resources = {} if resources is None else resources
+    converter = Converter(_meta_info(diagnostics))
+    # Resources that are not given are missing, they are not looked up on disk
+    converter.resources.provide(
+        {MEMORY_DIR / "docu" / name: resources.get(name) for name in HEADER_RESOURCES}
+    )
+    converter.set_package_metainfo({} if config is None else config)
+
+    writer = MemoryWriter()
+    converter.write_dtx(MEMORY_DIR / "docu", _convert_sections(converter, sections), writer)
+    yield from writer.chunks()
+
+
+def _meta_info(diagnostics: None | Diagnostics) -> MetaInformation:
+    meta_info = MetaInformation()
+    if diagnostics is not None:
+        meta_info.diagnostics = diagnostics
+    return meta_info
+
+
+def _convert_sections(
+    converter: Converter, sections: Mapping[str, str]
+) -> Iterator[tuple[str, Chunk, Chunk]]:
+    for name, text in sections.items():
+        fragments = converter.convert_text(name, text)
+        converter.meta_info.diagnostics.extend(fragments["diagnostics"])
+        yield name, fragments["docu"], fragments["impl"]
+
+
+def convert_package(
+    sections: Mapping[str, str],
+    resources: None | Mapping[str, str] = None,
+    config: None | Mapping[str, str] = None,
+    diagnostics: None | Diagnostics = None,
+) -> str:
+    """Convert a package and return its dtx file, see iter_dtx."""
+    return "".join(iter_dtx(sections, resources, config, diagnostics))
@@ -0,0 +1,118 @@
+import json
+import re
+from collections.abc import Callable
+from pathlib import Path
+from typing import Any
+
+from core.ir import PARAM_PATTERN, CommandIR, PackageIR, doc_text, signature
+from core.writer import write_if_changed
+
+
+def render_json(package: PackageIR) -> str:
+    """The package as JSON, the documentation lines without their comment signs."""
+    data = {key: value for key, value in package.items() if key != "sections"}
+    data["sections"] = [
+        {
+            "name": section["name"],
+            "file": section["file"],
+            "commands": [_command_json(command) for command in section["commands"]],
+        }
+        for section in package["sections"]
+    ]
+    return json.dumps(data, indent=2, ensure_ascii=False) + "\n"
+
+
+def _command_json(command: CommandIR) -> dict[str, Any]:
+    oarg = None
+    if command["oarg_default"]:
+        oarg = {
+            "name": command["oarg"][0],
+            "description": command["oarg"][1],
+            "default": command["oarg_default"],
+        }
+    return {
+        "name": command["name"],
+        "line": command["line"],
+        "private": command["private"],
+        "signature": signature(command),
+        "optional_argument": oarg,
+        "arguments": [{"name": name, "description": desc} for name, desc in command["args"]],
+        "description": [doc_text(line) for line in command["desc"]],
+        "equation": [doc_text(line, "Equation") for line in command["equation"]],
+        "example": [doc_text(line, "Example") for line in command["example"]],
+        "errors": [doc_text(line, "Error") for line in command["errors"]],
+        "todos": [doc_text(line, "TODO") for line in command["todos"]],
+        "implementation": "".join(command["implementation"]),
+    }
+
+
+def render_markdown(package: PackageIR) -> str:
+    """API reference of the public commands of the package in Markdown."""
+    lines = [f"# {package['name']}\n", "\n"]
+    if package["description"]:
+        lines.append(f"{package['description']}\n\n")
+    lines.append(f"Version {package['version']}, {package['date']}, {package['author']}\n")
+
+    for section in package["sections"]:
+        lines.append(f"\n## {section['name']}\n")
+        private = []
+        for command in section["commands"]:
+            if command["private"]:
+                private.append(f"`\\{command['name']}`")
+            else:
+                lines.extend(_command_markdown(command))
+        if private:
+            lines.append(f"\nPrivate helpers: {', '.join(private)}\n")
+    return "".join(lines)
+
+
+def _command_markdown(command: CommandIR) -> list[str]:
+    lines = [f"\n### `\\{command['name']}{signature(command)}`\n"]
+
+    # The parameters a number in the documentation text refers to
+    options = list(command["args"])
+    if command["oarg_default"]:
+        options.insert(0, command["oarg"])
+
+    def replace_match(match: re.Match) -> str:
+        n = int(match.group(1))
+        return f"*{options[n - 1][0]}*" if 0 < n <= len(options) else match.group(0)
+
+    desc = " ".join(doc_text(line) for line in command["desc"]).strip()
+    if desc:
+        lines.append(f"\n{PARAM_PATTERN.sub(replace_match, desc)}\n")
+
+    if options:
+        lines.append("\n| Argument | Description |\n| --- | --- |\n")
+        if command["oarg_default"]:
+            name, desc = command["oarg"]
+            default = _cell(command["oarg_default"])
+            lines.append(f"| `[{_cell(name)}]` | {_cell(desc)}, default: `{default}` |\n")
+        for name, desc in command["args"]:
+            lines.append(f"| `{{{_cell(name)}}}` | {_cell(desc)} |\n")
+
+    for title, box in [("Equation", command["equation"]), ("Example", command["example"])]:
+        if box:
+            lines.append(f"\n{title}:\n\n```latex\n")
+            lines.extend(f"{doc_text(line, title)}\n" for line in box)
+            lines.append("```\n")
+    for line in command["errors"]:
+        lines.append(f"\n> **Error:** {doc_text(line, 'Error')}\n")
+    return lines
+
+
+def _cell(text: str) -> str:
+    return text.strip().replace("|", "\\|")
+
+
+# Output backends besides the dtx, they render the IR of the whole package into one file
+BACKENDS: dict[str, Callable[[PackageIR], str]] = {
+    "json": render_json,
+    "markdown": render_markdown,
+}
+BACKEND_SUFFIXES = {"json": ".json", "markdown": ".md"}
+
+
+def write_backend(backend: str, package: PackageIR, file_path: Path, fsync: bool = False) -> bool:
+    """Render the package with the backend and write it, returns whether the file changed."""
+    return write_if_changed(file_path, BACKENDS[backend](package), fsync)
@@ -0,0 +1,245 @@
+import hashlib
+import json
+import os
+import shutil
+import time
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, BinaryIO, TypedDict
+
+from core.writer import DEFAULT_BUFFER_SIZE, Chunk
+
+if TYPE_CHECKING:
+    from core.diagnostics import Diagnostic
+    from core.discovery import FileStat
+    from core.ir import CommandIR
+    from core.symbols import MacroSymbol, RefSymbol
+
+CACHE_DIR_NAME = ".tex2dtx_cache"
+# Increase whenever the parsing or rendering changes to invalidate old entries
+CACHE_VERSION = 9
+# Default size limit of the cache directory in bytes
+DEFAULT_MAX_CACHE_SIZE = 64 * 1024 * 1024
+# Suffix of the entries, entries of older versions were pickled and are only removed
+ENTRY_SUFFIX = ".entry"
+LEGACY_SUFFIX = ".pkl"
+# Temporary files older than this (in seconds) were left by writes that crashed
+STALE_TMP_AGE = 60 * 60
+
+
+class SectionFragments(TypedDict):
+    # Converted sections are spooled, entries loaded from the cache are text
+    docu: "Chunk"
+    impl: "Chunk"
+    commands: int
+    macros: list["MacroSymbol"]
+    refs: list["RefSymbol"]
+    # Only collected if other backends than the dtx are selected
+    ir: None | list["CommandIR"]
+    # Reported again whenever the entry is used
+    diagnostics: list["Diagnostic"]
+
+
+class SectionCache:
+    """
+    Persistent cache for the parsed and rendered fragments of section files.
+
+    Entries are keyed by a content hash of the section file combined with a fingerprint
+    of everything else the rendering depends on. The least recently used entries are
+    evicted once the cache grows beyond its size limit.
+    An entry is a line of JSON followed by the raw text of the chunks, only plain data, so
+    a cache directory written by somebody else can at worst produce wrong output but never
+    run code.
+    """
+
+    def __init__(
+        self,
+        cache_dir: Path,
+        max_size: int = DEFAULT_MAX_CACHE_SIZE,
+        keep_in_memory: bool = False,
+    ):
+        self.cache_dir = cache_dir
+        self.max_size = max_size
+        self.fingerprint = ""
+
+        # Entries of the latest run, used when the same cache serves repeated runs
+        self.keep_in_memory = keep_in_memory
+        self._memory: dict[str, SectionFragments] = {}
+        # Keys of the section files by their path, with the fingerprint, name and stat they
+        # were computed for
+        self._keys: dict[Path, tuple[tuple[str, str, "FileStat"], str]] = {}
+
+    def set_fingerprint(self, paths: list[Path]):
+        """Compute the fingerprint of all files (e.g. templates, config) shared by all entries."""
+        sha = hashlib.sha256(f"v{CACHE_VERSION}".encode())
+        for path in paths:
+            sha.update(path.name.encode())
+            if path.is_file():
+                sha.update(path.read_bytes())
+        self.fingerprint = sha.hexdigest()
+
+    def make_key(self, section_name: str, file_dir: Path, stat: "None | FileStat" = None) -> str:
+        """
+        Hash the section file. Given its stat, the file is only hashed again if its stat
+        changed since the last key of the file was made.
+        """
+        state = None
+        if stat is not None:
+            state = (self.fingerprint, section_name, stat)
+            known = self._keys.get(file_dir)
+            if known is not None and known[0] == state:
+                return known[1]
+
+        sha = hashlib.sha256(self.fingerprint.encode())
+        sha.update(section_name.encode())
+        sha.update(file_dir.read_bytes())
+        key = sha.hexdigest()
+        if state is not None:
+            self._keys[file_dir] = (state, key)
+        return key
+
+    def contains(self, key: str) -> bool:
+        return key in self._memory or self._entry_path(key).is_file()
+
+    def get(self, key: str) -> None | SectionFragments:
+        """Load an entry and mark it as recently used, broken entries are removed."""
+        if key in self._memory:
+            return self._memory[key]
+
+        entry_path = self._entry_path(key)
+        try:
+            with open(entry_path, "rb") as f:
+                fragments = _read_entry(f)
+            os.utime(entry_path)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError, TypeError, KeyError):
+            entry_path.unlink(missing_ok=True)
+            return None
+
+        if self.keep_in_memory:
+            self._memory[key] = fragments
+        return fragments
+
+    def put(self, key: str, fragments: SectionFragments):
+        """
+        Store an entry. Spooled chunks are read without being consumed, but as the writer
+        consumes them, such entries are only kept in memory once they are loaded again.
+        """
+        text = isinstance(fragments["docu"], str) and isinstance(fragments["impl"], str)
+        if self.keep_in_memory and text:
+            self._memory[key] = fragments
+
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        entry_path = self._entry_path(key)
+        tmp_path = entry_path.with_suffix(f".{os.getpid()}.tmp")
+        try:
+            with open(tmp_path, "wb") as f:
+                _write_entry(f, fragments)
+            os.replace(tmp_path, entry_path)
+        except BaseException:
+            tmp_path.unlink(missing_ok=True)
+            raise
+
+    def retain(self, keys: set[str]):
+        """Drop all in-memory entries that do not belong to the given keys."""
+        self._memory = {key: value for key, value in self._memory.items() if key in keys}
+
+    def evict(self):
+        """
+        Remove the least recently used entries until the cache fits its size limit, along with
+        temporary files left by crashed writes.
+        """
+        if not self.cache_dir.is_dir():
+            return
+
+        entries = []
+        total_size = 0
+        # Younger temporary files may still be written by another process
+        stale_time = time.time_ns() - STALE_TMP_AGE * 1_000_000_000
+        with os.scandir(self.cache_dir) as it:
+            for entry in it:
+                if entry.is_file() and entry.name.endswith(LEGACY_SUFFIX):
+                    os.unlink(entry.path)
+                elif entry.is_file() and entry.name.endswith(".tmp"):
+                    if entry.stat().st_mtime_ns < stale_time:
+                        Path(entry.path).unlink(missing_ok=True)
+                elif entry.is_file() and entry.name.endswith(ENTRY_SUFFIX):
+                    stat = entry.stat()
+                    entries.append((stat.st_mtime_ns, stat.st_size, entry.path))
+                    total_size += stat.st_size
+
+        entries.sort()
+        for _, size, path in entries:
+            if total_size <= self.max_size:
+                break
+            Path(path).unlink(missing_ok=True)
+            total_size -= size
+
+    def clear(self):
+        self._memory.clear()
+        shutil.rmtree(self.cache_dir, ignore_errors=True)
+
+    def _entry_path(self, key: str) -> Path:
+        return self.cache_dir / f"{key}{ENTRY_SUFFIX}"
+
+
+def _write_entry(f: BinaryIO, fragments: SectionFragments):
+    # The chunks are mostly backslashes, as JSON strings they would be escaped, so they are
+    # stored as raw text followed by the header, whose sizes are only known afterwards
+    docu_size = _write_chunk(f, fragments["docu"])
+    impl_size = _write_chunk(f, fragments["impl"])
+    header = {
+        "version": CACHE_VERSION,
+        "docu_size": docu_size,
+        "impl_size": impl_size,
+        "commands": fragments["commands"],
+        "macros": fragments["macros"],
+        "refs": fragments["refs"],
+        "ir": fragments["ir"],
+        "diagnostics": fragments["diagnostics"],
+    }
+    # The header contains no line break, the one before it marks its start
+    f.write(b"\n" + json.dumps(header, separators=(",", ":")).encode("utf-8") + b"\n")
+
+
+def _write_chunk(f: BinaryIO, chunk: "Chunk") -> int:
+    """Write the chunk encoded, returns its size. Spooled files are rewound, not closed."""
+    size = 0
+    for part in [chunk] if isinstance(chunk, str) else chunk:
+        if isinstance(part, str):
+            size += f.write(part.encode("utf-8"))
+            continue
+        part.seek(0)
+        while block := part.read(DEFAULT_BUFFER_SIZE):
+            size += f.write(block.encode("utf-8"))
+        part.seek(0)
+    return size
+
+
+def _read_entry(f: BinaryIO) -> SectionFragments:
+    """The fragments of a stored entry, raises ValueError if it is not a valid entry."""
+    data = f.read()
+    header_start = data.rfind(b"\n", 0, len(data) - 1) + 1
+    header: Any = json.loads(data[header_start:])
+    if not isinstance(header, dict) or header.get("version") != CACHE_VERSION:
+        raise ValueError("Not a cache entry of this version.")
+    docu_size = header["docu_size"]
+    if docu_size + header["impl_size"] + 1 != header_start:
+        raise ValueError("Truncated cache entry.")
+    ir = header["ir"]
+    if ir is not None:
+        # JSON has no tuples
+        for command in ir:
+            command["oarg"] = tuple(command["oarg"])
+            command["args"] = [tuple(arg) for arg in command["args"]]
+    # Decoded without copying the chunks out of the data first
+    view = memoryview(data)
+    return {
+        "docu": str(view[:docu_size], "utf-8"),
+        "impl": str(view[docu_size : header_start - 1], "utf-8"),
+        "commands": int(header["commands"]),
+        "macros": list(header["macros"]),
+        "refs": list(header["refs"]),
+        "ir": ir,
+        "diagnostics": list(header["diagnostics"]),
+    }
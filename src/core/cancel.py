@@ -0,0 +1,67 @@
+import multiprocessing
+import time
+from typing import Any
+
+# Number of lines between two checks of the token while parsing
+CANCEL_STEP = 1024
+
+
+class ConversionCancelled(Exception):
+    """Raised inside the converter when a conversion is cancelled or exceeds its limits."""
+
+
+class CancelToken:
+    """
+    Cooperative cancellation of a conversion, checked between lines, objects and sections.
+
+    The token is backed by a multiprocessing event, so worker processes started with it see
+    the cancellation as well. The time and command limits are enforced by every process
+    on its own, the command limit of a worker applies to the sections it converts.
+    """
+
+    def __init__(
+        self, timeout: None | float = None, max_commands: None | int = None, event: Any = None
+    ):
+        self.timeout = timeout
+        self.max_commands = max_commands
+        self.event = multiprocessing.Event() if event is None else event
+        # Wall clock time the conversion has to be finished at, shared with worker processes
+        self.deadline: None | float = None
+        self.reason = "Conversion was cancelled."
+
+    @classmethod
+    def for_worker(cls, limits: tuple[None | float, None | int], event: Any) -> "CancelToken":
+        token = cls(max_commands=limits[1], event=event)
+        token.deadline = limits[0]
+        return token
+
+    def start(self):
+        """Arm the token for a new conversion."""
+        self.event.clear()
+        self.reason = "Conversion was cancelled."
+        self.deadline = None if self.timeout is None else time.time() + self.timeout
+
+    def limits(self) -> tuple[None | float, None | int]:
+        return self.deadline, self.max_commands
+
+    def cancel(self, reason: None | str = None):
+        if reason is not None:
+            self.reason = reason
+        self.event.set()
+
+    def cancelled(self) -> bool:
+        return self.event.is_set()
+
+    def check(self):
+        # The deadline is checked first, the event may have been set by another process
+        if self.deadline is not None and time.time() > self.deadline:
+            self.cancel("Conversion exceeded its timeout.")
+            raise ConversionCancelled(self.reason)
+        if self.event.is_set():
+            raise ConversionCancelled(self.reason)
+
+    def check_commands(self, count: int):
+        self.check()
+        if self.max_commands is not None and count > self.max_commands:
+            self.cancel(f"Conversion exceeded the limit of {self.max_commands} commands.")
+            raise ConversionCancelled(self.reason)
@@ -1,10 +1,66 @@
+import itertools
 import os
-import re
 import sys
+import tempfile
+from collections import deque
+from collections.abc import Generator, Iterable, Iterator, Mapping
+from concurrent.futures import Executor, Future, wait
 from datetime import date
 from pathlib import Path
-from typing import TypedDict
-
+from typing import IO, Any
+
+from core.cache import CACHE_DIR_NAME, CACHE_VERSION, SectionCache, SectionFragments
+from core.cancel import CancelToken
+from core.diagnostics import (
+    DUPLICATE_MACRO,
+    DUPLICATE_SECTION,
+    EMPTY_FILE,
+    ERROR,
+    INFO,
+    MALFORMED_BOX,
+    MISSING_FILE,
+    MISSING_PLACEHOLDER,
+    PARAM_OUT_OF_RANGE,
+    UNKNOWN_FILE,
+    UNNAMED_COMMAND,
+    Diagnostics,
+)
+from core.discovery import FileStat, SourceFiles, discover, section_name
+from core.ir import PARAM_PATTERN, CommandIR, SectionIR, command_ir, package_ir
+from core.offsets import (
+    OFFSET_INDEX_NAME,
+    OFFSET_INDEX_VERSION,
+    SectionOffsets,
+    fingerprint,
+    load_offset_index,
+    section_digest,
+    shift_ranges,
+    stale_reason,
+    write_offset_index,
+)
+from core.profiler import COMMAND, SECTION, Span
+from core.progress import PROGRESS_STEP, ProgressChannel, SectionProgress
+from core.resources import ResourceLoader
+from core.source import SourceBuffer, open_source, split_lines
+from core.symbols import (
+    SYMBOL_INDEX_NAME,
+    MacroSymbol,
+    SectionSymbols,
+    SymbolIndex,
+    collect_refs,
+    macro_symbol,
+)
+from core.tex_parser import ParsedObject, iter_source, parse_source
+from core.writer import (
+    Chunk,
+    DtxWriter,
+    MemoryWriter,
+    chunk_text,
+    encode_text,
+    file_digest,
+    splice_file,
+    write_if_changed,
+)
 from meta_information import MetaInformation
 
 if getattr(sys, "frozen", False):
@@ -15,24 +71,33 @@ else:
     TEMPLATE_PATH = Path(os.path.dirname(os.path.abspath(__file__))) / "tex_templates"
 
 
-class ParsedObject(TypedDict):
-    o_type: None | str
-    o_content: list[str]
-    o_category: Path
-
-
-class ParsedCommand(TypedDict):
-    name: str
-    oarg: tuple[str, str]
-    oarg_default: None | str
-    args: list[tuple[str, str]]
-    desc: list[str]
-    todos: list[str]
-    errors: list[str]
-    equation: list[str]
-    example: list[str]
-    implementation: list[str]
-    private: bool
+# Number of objects parsed at once before they are rendered, switching between the parser
+# and the renderer for every single object is slower
+PARSE_BATCH = 1024
+# Number of commands rendered between two flushes of a streamed section to its spools
+SPOOL_STEP = 4096
+# Size up to which the spools of a streamed section are kept in memory
+SPOOL_MAX_SIZE = 4 * 1024 * 1024
+
+# Guards around the implementation, docstrip extracts the lines in between into the sty
+IMPL_PROLOGUE = "% \\iffalse\n%<*package>\n% \\fi\n"
+SHARD_EPILOGUE = "% \\iffalse\n%</package>\n% \\fi\n"
+
+# Templates and files of the docu resource dir the header is assembled from
+HEADER_TEMPLATES = [
+    "01_head.tex",
+    "02_preamble_template.tex",
+    "03_postamble_template.tex",
+    "04_generate_template.tex",
+    "05_predocument.tex",
+    "06_document_template.tex",
+]
+HEADER_RESOURCES = [
+    "pkg_packages.tex",
+    "docu_packages_and_settings.tex",
+    "introduction.tex",
+    "example.tex",
+]
 
 
 class Converter:
@@ -41,43 +106,718 @@ class Converter:
     https://www.tug.org/TUGboat/tb29-2/tb92pakin.pdf
     """
 
-    def __init__(self, meta_info: MetaInformation):
+    def __init__(
+        self,
+        meta_info: MetaInformation,
+        resident: bool = False,
+        executor: None | Executor = None,
+    ):
         self.meta_info = meta_info
-
-    def execute(self):
+        # Keep converted sections in memory when the converter is executed repeatedly
+        self.resident = resident
+        # Worker pool shared with other converters, otherwise a pool is created per run
+        self.executor = executor
+        self.cache: None | SectionCache = None
+        self._section_keys: dict[str, str] = {}
+        # Stat of the section files found by the last discovery, by their section name
+        self._file_stats: dict[str, FileStat] = {}
+        self._symbols: list[SectionSymbols] = []
+        # IR of all sections of the last run, only collected for the other backends
+        self._sections_ir: list[SectionIR] = []
+        # Reads the header resources and templates in the background
+        self.resources = ResourceLoader()
+
+    def execute(self, update: bool = False):
+        """
+        Convert the package. With update only the changed sections are converted and spliced
+        into the existing dtx if possible, see _update.
+        """
+        progress = self.meta_info.progress
+        if self.meta_info.cancel is not None:
+            self.meta_info.cancel.start()
+        self.meta_info.diagnostics.clear()
+        try:
+            if not (update and self._update()):
+                self._execute()
+        except BaseException as e:
+            if progress is not None:
+                progress.finish(str(e) or type(e).__name__)
+            raise
+        finally:
+            self.meta_info.diagnostics.flush()
+        if progress is not None:
+            progress.finish()
+
+    def _execute(self):
         rsc_dir: Path = self.meta_info.rsc_dir
+        profiler = self.meta_info.profiler
+        profiler.clear()
+        self.meta_info.command_count = 0
+        self.meta_info.output_rewritten = False
+
+        # Issue all small reads at once, they complete while the sections are scanned and parsed
+        self.resources.clear()
+        self.resources.prefetch(
+            [rsc_dir / "package_config.txt"]
+            + [rsc_dir / "docu" / file_name for file_name in HEADER_RESOURCES]
+        )
+        self.resources.prefetch_templates(TEMPLATE_PATH / name for name in HEADER_TEMPLATES)
+
+        with profiler.span("scan"):
+            files = self._discover(rsc_dir)
+
+        with profiler.span("load_package_metainfo"):
+            self._load_package_metainfo(rsc_dir)
+        with profiler.span("setup_cache"):
+            self._setup_cache(rsc_dir)
+
+        section_files = files["sections"]
+        self._skip_files(files)
+        # Taken before the header adds the resources to the package information
+        offset_fingerprint = self._offset_fingerprint(rsc_dir)
+
+        if self.meta_info.progress is not None:
+            self.meta_info.progress.start(
+                sum(self._file_stats[key][1] for key in section_files),
+                len(section_files),
+            )
+
+        # Stream all data into one dtx, or into one pair of files per section it includes
+        pkg_name = self.pkg_meta["pkg_name"]
+        self.meta_info.output_file = self.meta_info.tgt_dir / f"{pkg_name}.dtx"
+        sections = self._convert_sections(section_files)
+        if self.meta_info.sharded:
+            sources = [f"{pkg_name}.dtx"] + [
+                shard_name(str(pkg_name), key, "impl") for key in section_files
+            ]
+            sections = self._write_shards(str(pkg_name), sections)
+            self.pkg_meta["pkg_sources"] = "".join(
+                f"\\from{{{file}}}{{package}}" for file in sources
+            )
+        outputs: dict[Path, Future[bool]] = {}
+        try:
+            with self._open_writer(self.meta_info.output_file.name) as writer:
+                with profiler.span("tex_to_dtx"):
+                    self._tex_to_dtx(rsc_dir / "docu", sections, writer)
+                # The other backends render the IR while the dtx is finished
+                outputs = self._submit_backends(str(pkg_name))
+                with profiler.span("write"):
+                    writer.close()
+        finally:
+            # Stops the workers of a cancelled or failed conversion right away
+            sections.close()
+        self.meta_info.output_rewritten = writer.rewritten
+        if writer.rewritten:
+            print(f"Wrote {self.meta_info.output_file.name}.")
+        else:
+            print(f"Output unchanged, kept {self.meta_info.output_file.name}.")
 
-        self.meta_info.set_max_file_count(len(list(rsc_dir.iterdir())))
+        with profiler.span("offset_index"):
+            index_path = self.meta_info.tgt_dir / OFFSET_INDEX_NAME
+            if self.meta_info.sharded:
+                # The sections are not part of the dtx
+                index_path.unlink(missing_ok=True)
+            else:
+                self._write_offset_index(index_path, writer, section_files, offset_fingerprint)
+
+        with profiler.span("symbol_index"):
+            self._write_symbol_index(rsc_dir / "docu")
+        with profiler.span("backends"):
+            for file_path, output in outputs.items():
+                if output.result():
+                    print(f"Wrote {file_path.name}.")
+                else:
+                    print(f"Output unchanged, kept {file_path.name}.")
 
-        self._load_package_metainfo(rsc_dir)
+        if self.cache is not None:
+            self.cache.retain(set(self._section_keys.values()))
+            self.cache.evict()
+            print(
+                f"Cache: {self.meta_info.cache_hits} hits, "
+                f"{self.meta_info.cache_misses} misses."
+            )
 
-        parsed_tex: dict[str, list[ParsedObject]] = {}
-        for file_dir in list(rsc_dir.iterdir()):
-            ext = file_dir.suffix
+        self.meta_info.finished = True
 
-            if ext == ".tex":
-                section_name = file_dir.stem.split("_")[1]
-                parsed_tex[section_name] = self._parse_tex(file_dir)
-            else:
-                print(f"Unknown file type for file {file_dir.stem}.")
+    def check(self) -> bool:
+        """
+        Parse and validate all section files without rendering or writing anything. Returns
+        whether no errors were found, more warnings than allowed cancel the check.
+        """
+        rsc_dir: Path = self.meta_info.rsc_dir
+        diagnostics = self.meta_info.diagnostics
+        diagnostics.clear()
+        command_count = 0
+        # Location of the first definition of every macro
+        definitions: dict[str, str] = {}
+        try:
+            self.resources.clear()
+            self._load_package_metainfo(rsc_dir)
+            files = self._discover(rsc_dir)
+            section_files = files["sections"]
+            self._skip_files(files)
+            for file_name in HEADER_RESOURCES:
+                if not (rsc_dir / "docu" / file_name).is_file():
+                    diagnostics.report(
+                        MISSING_FILE,
+                        "File does not exist.",
+                        file=str(rsc_dir / "docu" / file_name),
+                    )
+
+            for file_dir in section_files.values():
+                section = diagnostics.section(str(file_dir))
+                try:
+                    with open_source(file_dir) as source:
+                        for obj in iter_source(source, None, self.meta_info.cancel, section):
+                            if obj.o_command is None:
+                                continue
+                            command = command_ir(obj.o_command)
+                            command_count += 1
+                            self._validate_command(command, section)
+                            location = f"{file_dir}:{command['line']}"
+                            first = definitions.setdefault(command["name"], location)
+                            if first != location:
+                                section.report(
+                                    DUPLICATE_MACRO,
+                                    f"Macro {command['name']} is already defined at {first}.",
+                                    command["line"],
+                                )
+                except BaseException:
+                    diagnostics.extend(section.entries, check=False)
+                    raise
+                diagnostics.extend(section.entries)
+        finally:
+            diagnostics.flush()
+        print(f"Checked {len(section_files)} sections with {command_count} commands.")
+        return diagnostics.counts()[ERROR] == 0
+
+    def _validate_command(self, command: CommandIR, diagnostics: Diagnostics):
+        """Report the problems of a command that the rendering would report or fail on."""
+        name = command["name"]
+        line = command["line"]
+        # The parser names commands without a \newcommand\name unknown
+        if name == "unknown":
+            diagnostics.report(UNNAMED_COMMAND, "Definition without a macro name.", line)
+
+        option_count = len(command["args"]) + (1 if command["oarg_default"] else 0)
+        doc_lines = command["desc"] + command["equation"] + command["example"] + command["errors"]
+        for n in sorted(
+            {int(n) for doc_line in doc_lines for n in PARAM_PATTERN.findall(doc_line)}
+        ):
+            if n > option_count:
+                diagnostics.report(
+                    PARAM_OUT_OF_RANGE, f"Replacement error: {name} has no parameter #{n}.", line
+                )
+
+        # The boxes are filled with the text after the keyword and its colon
+        for keyword, box_lines in [
+            ("Equation", command["equation"]),
+            ("Example", command["example"]),
+            ("Error", command["errors"]),
+        ]:
+            if any(f"% {keyword}:" not in box_line for box_line in box_lines):
+                diagnostics.report(
+                    MALFORMED_BOX,
+                    f"{keyword} line of {name} without a colon, it can not be rendered.",
+                    line,
+                    ERROR,
+                )
+
+    def _discover(self, rsc_dir: Path) -> SourceFiles:
+        """Find the section files and remember their stat for the next runs."""
+        files = discover(
+            rsc_dir, self.meta_info.include, self.meta_info.exclude, [self.meta_info.tgt_dir]
+        )
+        self._file_stats = files["stats"]
+        self.meta_info.set_max_file_count(
+            len(files["sections"]) + len(files["unmatched"]) + len(files["replaced"])
+        )
+        return files
 
+    def _skip_files(self, files: SourceFiles):
+        for file_dir in files["unmatched"]:
+            self.meta_info.diagnostics.report(
+                UNKNOWN_FILE, "Not a section file, skipped.", severity=INFO, file=str(file_dir)
+            )
+            self.meta_info.incr_file_count()
+        for file_dir in files["replaced"]:
+            self.meta_info.diagnostics.report(
+                DUPLICATE_SECTION,
+                f"Section {section_name(file_dir.name)} is replaced by a later file, skipped.",
+                file=str(file_dir),
+            )
             self.meta_info.incr_file_count()
 
-        # Save all data to one dtx
-        res_dtx = self._tex_to_dtx(rsc_dir / "docu", parsed_tex)
-        # TODO
-        self._save_to_dir(f"{self.pkg_meta['pkg_name']}.dtx", res_dtx)
-
+    def _update(self) -> bool:
+        """
+        Convert only the sections that changed since the last conversion and splice them into
+        the existing dtx at the ranges recorded in its offset index. Returns False without
+        changing anything if the index is missing or stale, then a full conversion is needed.
+        """
+        rsc_dir: Path = self.meta_info.rsc_dir
+        tgt_dir: Path = self.meta_info.tgt_dir
+        profiler = self.meta_info.profiler
+        profiler.clear()
+        self.meta_info.command_count = 0
+        self.meta_info.output_rewritten = False
+
+        self.resources.clear()
+        with profiler.span("scan"):
+            files = self._discover(rsc_dir)
+        with profiler.span("load_package_metainfo"):
+            self._load_package_metainfo(rsc_dir)
+        section_files = files["sections"]
+
+        pkg_name = self.pkg_meta["pkg_name"]
+        output_file = tgt_dir / f"{pkg_name}.dtx"
+        self.meta_info.output_file = output_file
+        index_path = tgt_dir / OFFSET_INDEX_NAME
+        with profiler.span("check_offset_index"):
+            index = load_offset_index(index_path)
+            reason = stale_reason(
+                index, output_file, self._offset_fingerprint(rsc_dir), section_files
+            )
+        if index is None or reason is not None:
+            print(f"{reason} Converting the whole package.")
+            return False
+        self._skip_files(files)
+
+        # Only the files whose stat changed since they were hashed are hashed again
+        changed: dict[str, SectionOffsets] = {}
+        for section in index["sections"]:
+            stat = self._file_stats[section["name"]]
+            if tuple(section["stat"]) != stat:
+                digest = section_digest(section_files[section["name"]])
+                if digest != section["digest"]:
+                    section["digest"] = digest
+                    changed[section["name"]] = section
+                section["stat"] = stat
+        progress = self.meta_info.progress
+        if progress is not None:
+            progress.start(sum(self._file_stats[key][1] for key in changed), len(changed))
+
+        replacements: list[tuple[int, int, bytes]] = []
+        new_sizes: dict[tuple[str, str], int] = {}
+        symbols: list[SectionSymbols] = []
+        for key, section in changed.items():
+            fragments = self._convert_section(key, section_files[key])
+            self.meta_info.diagnostics.extend(fragments["diagnostics"])
+            self.meta_info.command_count += fragments["commands"]
+            if self.meta_info.cancel is not None:
+                self.meta_info.cancel.check_commands(self.meta_info.command_count)
+            for part in ("docu", "impl"):
+                start, end = section["docu"] if part == "docu" else section["impl"]
+                data = encode_text(chunk_text(fragments["docu" if part == "docu" else "impl"]))
+                replacements.append((start, end, data))
+                new_sizes[(key, part)] = len(data)
+            symbols.append(
+                {
+                    "section": key,
+                    "file": str(section_files[key]),
+                    "macros": fragments["macros"],
+                    "refs": fragments["refs"],
+                }
+            )
+            self.meta_info.incr_file_count()
+            if progress is not None:
+                progress.section_done(key)
+
+        if len(changed) == 0:
+            # Keeps the stat of files that were saved without changes
+            write_offset_index(index_path, index)
+            print(f"Output unchanged, kept {output_file.name}.")
+            return True
+
+        with profiler.span("splice"):
+            replacements.sort()
+            splice_file(
+                output_file, replacements, self.meta_info.buffer_size, self.meta_info.fsync
+            )
+            shift_ranges(index, new_sizes)
+            index["size"] = output_file.stat().st_size
+            index["digest"] = file_digest(output_file).hex()
+            write_offset_index(index_path, index)
+        self.meta_info.output_rewritten = True
+        print(f"Updated {len(changed)} of {len(section_files)} sections in {output_file.name}.")
+
+        with profiler.span("symbol_index"):
+            with SymbolIndex(tgt_dir / SYMBOL_INDEX_NAME) as symbol_index:
+                if symbol_index.is_current():
+                    symbol_index.replace_sections(symbols)
         self.meta_info.finished = True
+        return True
+
+    def _offset_fingerprint(self, rsc_dir: Path) -> str:
+        """
+        Hash of the templates, docu resources and package information the dtx depends on,
+        taken before the resources are added to the package information.
+        """
+        return fingerprint(
+            sorted(TEMPLATE_PATH.iterdir())
+            + [rsc_dir / "docu" / file_name for file_name in HEADER_RESOURCES],
+            {"cache_version": CACHE_VERSION, **self.pkg_meta},
+        )
 
-    def _save_to_dir(self, filename: str, content: str):
+    def _write_offset_index(
+        self,
+        index_path: Path,
+        writer: DtxWriter,
+        section_files: dict[str, Path],
+        offset_fingerprint: str,
+    ):
+        output_file = writer.file_path
+        sections: list[SectionOffsets] = [
+            {
+                "name": key,
+                "file": str(file_dir),
+                "digest": section_digest(file_dir),
+                "stat": self._file_stats[key],
+                "docu": writer.docu_ranges[key],
+                "impl": writer.impl_ranges[key],
+            }
+            for key, file_dir in section_files.items()
+        ]
+        write_offset_index(
+            index_path,
+            {
+                "version": OFFSET_INDEX_VERSION,
+                "fingerprint": offset_fingerprint,
+                "output": output_file.name,
+                "size": output_file.stat().st_size,
+                "digest": file_digest(output_file).hex(),
+                "sections": sections,
+            },
+        )
+
+    def convert_section(self, section_name: str) -> SectionFragments:
+        """
+        Convert a single section of the resource dir without writing the dtx. The section is
+        taken from the cache of the previous runs if it did not change since.
+        """
+        rsc_dir: Path = self.meta_info.rsc_dir
+        section_file = self._discover(rsc_dir)["sections"].get(section_name)
+        if section_file is None:
+            raise FileNotFoundError(f"There is no section {section_name} in {rsc_dir}.")
+
+        cache = self.cache
+        if cache is None:
+            return self._convert_section(section_name, section_file)
+        key = cache.make_key(section_name, section_file, self._file_stats.get(section_name))
+        fragments = cache.get(key)
+        if fragments is None:
+            fragments = self._convert_section(section_name, section_file)
+            cache.put(key, fragments)
+        return fragments
+
+    def _setup_cache(self, rsc_dir: Path):
+        self.meta_info.cache_hits = 0
+        self.meta_info.cache_misses = 0
+
+        cache_dir = self.meta_info.tgt_dir / CACHE_DIR_NAME
+        if self.cache is not None and self.cache.cache_dir == cache_dir:
+            cache = self.cache
+        else:
+            cache = SectionCache(cache_dir, self.meta_info.max_cache_size, self.resident)
+        if self.meta_info.clear_cache:
+            cache.clear()
+            # Only clear the cache for the first run
+            self.meta_info.clear_cache = False
+
+        if self.meta_info.use_cache:
+            cache.set_fingerprint(
+                sorted(TEMPLATE_PATH.iterdir()) + [rsc_dir / "package_config.txt"]
+            )
+            self.cache = cache
+        else:
+            self.cache = None
+
+    def _submit_backends(self, pkg_name: str) -> dict[Path, Future[bool]]:
+        """Render the IR of the package with all selected backends concurrently."""
+        # Imported here, the backends are only needed when they are selected
+        from core.backends import BACKEND_SUFFIXES, write_backend
+
+        package = package_ir(self.pkg_meta, self._sections_ir)
+        outputs = {}
+        for backend in self.meta_info.backends:
+            file_path = self.meta_info.tgt_dir / f"{pkg_name}{BACKEND_SUFFIXES[backend]}"
+            outputs[file_path] = self.resources.submit(
+                write_backend, backend, package, file_path, self.meta_info.fsync
+            )
+        return outputs
+
+    def _convert_sections(
+        self, section_files: dict[str, Path]
+    ) -> Generator[tuple[str, Chunk, Chunk], None, None]:
+        """
+        Parse and render all section files, yielding (name, docu, impl) in the given order.
+        Unchanged sections are taken from the cache, all others are converted.
+        """
+        cache = self.cache
+        progress = self.meta_info.progress
+        cancel = self.meta_info.cancel
+        collect_ir = len(self.meta_info.backends) > 0
+        keys: dict[str, str] = {}
+        self._section_keys = keys
+        self._symbols = []
+        self._sections_ir = []
+        pending: dict[str, Path] = {}
+        with self.meta_info.profiler.span("cache_lookup"):
+            for key, file_dir in section_files.items():
+                if cache is not None:
+                    keys[key] = cache.make_key(key, file_dir, self._file_stats.get(key))
+                    if cache.contains(keys[key]):
+                        continue
+                pending[key] = file_dir
+
+        converted = self._convert_section_files(pending)
+        for key, file_dir in section_files.items():
+            # Converted sections check the token themselves and report why they stopped
+            if cancel is not None and key not in pending:
+                cancel.check()
+            fragments = None
+            if cache is not None and key not in pending:
+                fragments = cache.get(keys[key])
+                # Entries of runs without the other backends have no IR
+                if fragments is not None and collect_ir and fragments["ir"] is None:
+                    fragments = None
+
+            if fragments is not None:
+                self.meta_info.cache_hits += 1
+                if progress is not None:
+                    progress.advance(key, 2 * self._file_stats[key][1], fragments["commands"])
+            else:
+                if key in pending:
+                    _, fragments = next(converted)
+                else:
+                    # The cache entry was broken, convert the section again
+                    fragments = self._convert_section(
+                        key, file_dir, spool=True, collect_ir=collect_ir
+                    )
+                if cache is not None:
+                    self.meta_info.cache_misses += 1
+                    cache.put(keys[key], fragments)
+
+            self.meta_info.command_count += fragments["commands"]
+            if cancel is not None:
+                cancel.check_commands(self.meta_info.command_count)
+            self.meta_info.diagnostics.extend(fragments["diagnostics"])
+            self._symbols.append(
+                {
+                    "section": key,
+                    "file": str(file_dir),
+                    "macros": fragments["macros"],
+                    "refs": fragments["refs"],
+                }
+            )
+            if collect_ir and fragments["ir"] is not None:
+                self._sections_ir.append(
+                    {"name": key, "file": str(file_dir), "commands": fragments["ir"]}
+                )
+            self.meta_info.incr_file_count()
+            if progress is not None:
+                progress.section_done(key)
+            yield key, fragments["docu"], fragments["impl"]
+
+    def _write_shards(
+        self, pkg_name: str, sections: Generator[tuple[str, Chunk, Chunk], None, None]
+    ) -> Generator[tuple[str, Chunk, Chunk], None, None]:
+        """
+        Write the documentation and implementation of every section into its own file and
+        yield the lines that include them instead. Unchanged files are not rewritten.
+        """
+        tgt_dir = self.meta_info.tgt_dir
+        rewritten = 0
+        count = 0
+        try:
+            for key, docu_chunk, impl_chunk in sections:
+                docu_file = shard_name(pkg_name, key, "docu")
+                impl_file = shard_name(pkg_name, key, "impl")
+                with self.meta_info.profiler.span("write_shard"):
+                    rewritten += write_if_changed(
+                        tgt_dir / docu_file, chunk_text(docu_chunk), self.meta_info.fsync
+                    )
+                    rewritten += write_if_changed(
+                        tgt_dir / impl_file,
+                        IMPL_PROLOGUE + chunk_text(impl_chunk) + SHARD_EPILOGUE,
+                        self.meta_info.fsync,
+                    )
+                count += 2
+                # The files are read with the catcodes of the including file, \DocInput
+                # would make % a comment character again after the first shard
+                yield key, f"% \\input{{{docu_file}}}\n", f"% \\input{{{impl_file}}}\n"
+        finally:
+            sections.close()
+        print(f"Shards: {rewritten} of {count} files rewritten.")
+
+    def _convert_section_files(
+        self, section_files: dict[str, Path]
+    ) -> Iterator[tuple[str, SectionFragments]]:
+        """
+        Convert the given section files, yielding (name, fragments) in the given order.
+        With more than one job the sections are converted in a process pool.
+        """
+        collect_ir = len(self.meta_info.backends) > 0
+        jobs = self.meta_info.jobs
+        if self.executor is not None and len(section_files) > 0:
+            yield from self._map_section_files(self.executor, section_files, collect_ir)
+        elif jobs > 1 and len(section_files) > 1:
+            executor = worker_pool(min(jobs, len(section_files)), self.meta_info.cancel)
+            try:
+                yield from self._map_section_files(executor, section_files, collect_ir)
+            finally:
+                # Sections that did not start yet are dropped if the conversion stopped early
+                executor.shutdown(cancel_futures=True)
+        else:
+            # The rendered sections are spooled, even a large one needs little memory
+            for key, file_dir in section_files.items():
+                yield key, self._convert_section(key, file_dir, spool=True, collect_ir=collect_ir)
+
+    def _map_section_files(
+        self,
+        executor: Executor,
+        section_files: dict[str, Path],
+        collect_ir: bool,
+    ) -> Iterator[tuple[str, SectionFragments]]:
+        profiler = self.meta_info.profiler
+        progress = self.meta_info.progress
+        cancel = self.meta_info.cancel
+        progress_events = None if progress is None else progress.worker_queue()
+        limits = None if cancel is None else cancel.limits()
+        futures = deque(
+            executor.submit(
+                _convert_section_worker,
+                key,
+                file_dir,
+                (profiler.enabled, profiler.commands),
+                progress_events,
+                limits,
+                collect_ir,
+            )
+            for key, file_dir in section_files.items()
+        )
+        try:
+            for key in section_files:
+                fragments, spans = futures.popleft().result()
+                profiler.spans.extend(spans)
+                yield key, fragments
+        finally:
+            # A pool shared by several conversions would keep running the sections of a
+            # stopped one, the next conversion clears the cancel event they are waiting for
+            for future in futures:
+                future.cancel()
+            wait(futures)
+
+    def convert_text(self, section_name: str, text: str) -> SectionFragments:
+        """Parse and render a section given as text instead of a file."""
+        return self._convert_section(section_name, Path(section_name), text)
+
+    def write_dtx(
+        self,
+        docu_dir: Path,
+        sections: Iterable[tuple[str, Chunk, Chunk]],
+        writer: DtxWriter | MemoryWriter,
+    ):
+        """Write the header and the (name, docu, impl) chunks of all sections in order."""
+        self._tex_to_dtx(docu_dir, sections, writer)
+
+    def _convert_section(
+        self,
+        section_name: str,
+        file_dir: Path,
+        text: None | str = None,
+        spool: bool = False,
+        collect_ir: bool = False,
+    ) -> SectionFragments:
+        """
+        Parse and render a single section file, or the given text of it. Every object is
+        rendered as soon as it is parsed and released.
+        With spool the rendered section is spooled to temporary files instead of joined.
+        With collect_ir the IR of the commands is returned for the other backends.
+        """
+        profiler = self.meta_info.profiler
+        progress = self.meta_info.progress
+        parse_progress = None if progress is None else SectionProgress(progress, section_name)
+        render_progress = None if progress is None else SectionProgress(progress, section_name)
+
+        macros: list[MacroSymbol] = []
+        commands: None | list[CommandIR] = [] if collect_ir else None
+        diagnostics = self.meta_info.diagnostics.section(str(file_dir))
+        with profiler.span(section_name, SECTION, file=str(file_dir)):
+            if text is None:
+                source = open_source(file_dir)
+            else:
+                source = SourceBuffer(file_dir, text.encode("utf-8"))
+            objects = iter_source(
+                source,
+                None if parse_progress is None else parse_progress.update,
+                self.meta_info.cancel,
+                diagnostics,
+            )
+            try:
+                # The objects are parsed in batches while rendering
+                with profiler.span("parse_render"):
+                    docu_chunk, impl_chunk = self._section_to_dtx(
+                        section_name,
+                        itertools.chain.from_iterable(itertools.batched(objects, PARSE_BATCH)),
+                        render_progress,
+                        macros,
+                        spool,
+                        commands,
+                        diagnostics,
+                    )
+                if parse_progress is not None and render_progress is not None:
+                    parse_progress.update(len(source))
+                    render_progress.update(len(source))
+                refs = collect_refs(source)
+            except BaseException:
+                # Report what was found up to the failure
+                self.meta_info.diagnostics.extend(diagnostics.entries, check=False)
+                raise
+            finally:
+                source.close()
+        return {
+            "docu": docu_chunk,
+            "impl": impl_chunk,
+            "commands": len(macros),
+            "macros": macros,
+            "refs": refs,
+            "ir": commands,
+            "diagnostics": diagnostics.entries,
+        }
+
+    def _write_symbol_index(self, rsc_dir: Path):
+        """Store the macros of all sections and the references to them in the target dir."""
+        symbols = list(self._symbols)
+        # References in the documentation resources belong to no section
+        for file_name in ["introduction.tex", "example.tex"]:
+            file_dir = rsc_dir / file_name
+            if file_dir.exists():
+                with open_source(file_dir) as source:
+                    refs = collect_refs(source)
+                symbols.append({"section": "", "file": str(file_dir), "macros": [], "refs": refs})
+
+        with SymbolIndex(self.meta_info.tgt_dir / SYMBOL_INDEX_NAME) as index:
+            index.rebuild(symbols)
+
+    def _open_writer(self, filename: str) -> DtxWriter:
         tgt_dir = self.meta_info.tgt_dir
         print(tgt_dir / filename)
 
-        with open(tgt_dir / filename, "w", encoding="utf-8") as f:
-            f.write(content)
+        return DtxWriter(tgt_dir / filename, self.meta_info.buffer_size, self.meta_info.fsync)
 
     def _load_package_metainfo(self, rsc_dir: Path):
+        pkginfo = self.resources.read(rsc_dir / "package_config.txt")
+        # Load file if it exists, otherwise use default
+        config = {}
+        if pkginfo is not None:
+            for line in split_lines(pkginfo):
+                if "=" in line:
+                    key, value = line.strip().split("=", 1)
+                    config[key] = value
+        self.set_package_metainfo(config)
+
+    def set_package_metainfo(self, config: Mapping[str, str]):
+        """Set the package meta information, all values missing in config are defaults."""
         # default setup
         self.pkg_meta: dict[str, str | float] = {
             "pkg_name": "SamplePackage",
@@ -88,150 +828,204 @@ class Converter:
             "pkg_version": 1.0,
             "pkg_info_text": "Info text",
         }
-
-        pkginfo_file_path = rsc_dir / "package_config.txt"
-        # Load file if it exists, otherwise use default
-        if pkginfo_file_path.exists():
-            with pkginfo_file_path.open("r", encoding="utf-8") as f:
-                for line in f:
-                    if "=" in line:
-                        key, value = line.strip().split("=", 1)
-                        if key == "pkg_date" and value == "today":
-                            self.pkg_meta[key] = date.today().strftime("%Y/%m/%d")
-                        else:
-                            self.pkg_meta[key] = value
+        for key, value in config.items():
+            if key == "pkg_date" and value == "today":
+                self.pkg_meta[key] = date.today().strftime("%Y/%m/%d")
+            else:
+                self.pkg_meta[key] = value
+        # The files docstrip extracts the package from
+        self.pkg_meta["pkg_sources"] = f"\\from{{{self.pkg_meta['pkg_name']}.dtx}}{{package}}"
 
     def _parse_tex(self, file_dir: Path) -> list[ParsedObject]:
-        tex_objects: list[ParsedObject] = []
-        with open(file_dir, encoding="utf-8") as f:
-            cur_object: ParsedObject = {"o_type": None, "o_content": [], "o_category": file_dir}
-
-            lines = f.readlines()
-            for line in lines:
-                if line.startswith("\\newcommand"):
-                    cur_object["o_type"] = "command"
-                elif line.startswith("}"):
-                    cur_object["o_content"].append(line)
-                    tex_objects.append(cur_object)
-                    cur_object = {
-                        "o_type": None,
-                        "o_content": [],
-                        "o_category": file_dir,
-                    }
-                # If the line starts with % then it must be comment
-                elif (
-                    line.startswith("% ")
-                    and cur_object["o_type"] != "command"
-                    and cur_object["o_type"] != "header"
-                ):
-                    cur_object["o_type"] = "comment"
-                elif line.startswith("%%") and cur_object["o_type"] == "header":
-                    cur_object["o_type"] = None
-                elif line.startswith("%%") and cur_object["o_type"] != "command":
-                    cur_object["o_type"] = "header"
-                # If the line is empty and the current object type is comment - reset
-                elif line.rstrip() == "" and cur_object["o_type"] == "comment":
-                    cur_object = {
-                        "o_type": None,
-                        "o_content": [],
-                        "o_category": file_dir,
-                    }
-                elif cur_object["o_type"] is None and line.rstrip() != "":
-                    print(f"Unprocessed line: {line.strip()}.")
-
-                if cur_object["o_type"] == "command" or cur_object["o_type"] == "comment":
-                    cur_object["o_content"].append(line)
-
-        return tex_objects
-
-    def _tex_to_dtx(self, rsc_dir: Path, parsed_tex: dict[str, list[ParsedObject]]) -> str:
-        docu_output = ""
-        impl_output = ""
-        # impl_output += "%    \\begin{macrocode}\n"
-        # impl_output += "%    \\end{macrocode}\n\n"
-        impl_output += "% \\iffalse\n"
-        impl_output += "%<*package>\n"
-        impl_output += "% \\fi\n"
-
-        output = ""
-        output += self._add_header(rsc_dir)
-
-        for key, value in parsed_tex.items():
-            cur_docu_output = ""
-            # cur_docu_output = f"% \\subsection{{{key}}}\n"
-            # docu_output += "% \\etocsettocstyle{}{}\n"
-            # docu_output += "% \\etocsetnexttocdepth{3}\n"
-            # docu_output += "% \\localtableofcontents*\n"
-
-            docu_table = "% \\begin{center}\n"
-            docu_table += "% \\begin{tabularx}{\\textwidth}{l p{8cm}} \\hline\n"
-            docu_table += "% \\textbf{Command} & \\textbf{Arguments} "
-            docu_table += "\\\\ \\hline\n"
-            impl_table = "% \\begin{center}\n"
-            impl_table += "% \\begin{tabularx}{\\textwidth}{l p{8cm}} \\hline\n"
-            impl_table += "% \\textbf{Command} & \\textbf{Arguments} "
-            impl_table += "\\\\ \\hline\n"
-
-            cur_impl_output = ""
-            # cur_impl_output = f"% \\subsection{{{key}}}\n"
-            # impl_output += "% \\etocsettocstyle{}{}\n"
-            # impl_output += "% \\etocsetnexttocdepth{3}\n"
-            # impl_output += "% \\localtableofcontents*\n"
-
-            # For private functions
-            footer = ""
-
-            for obj in value:
-                if obj["o_type"] == "command":
-                    obj_docu, obj_impl, cmd = self._parse_command(obj)
-                    if cmd["private"]:
-                        footer += obj_impl
+        source = open_source(file_dir)
+        try:
+            parsed = parse_source(source)
+        except BaseException:
+            source.close()
+            raise
+        # The parsed objects are kept, so they must not depend on the mapped file
+        source.detach()
+        return parsed
+
+    def _tex_to_dtx(
+        self,
+        rsc_dir: Path,
+        sections: Iterable[tuple[str, Chunk, Chunk]],
+        writer: DtxWriter | MemoryWriter,
+    ):
+        # writer.write_impl("%    \\begin{macrocode}\n")
+        # writer.write_impl("%    \\end{macrocode}\n\n")
+        writer.write_impl(IMPL_PROLOGUE)
+
+        # The header is assembled in the background while the first sections are converted,
+        # their documentation is held back until the header is written
+        header: None | Future[str] = self.resources.submit(self._assemble_header, rsc_dir)
+        pending_docu: list[tuple[str, Chunk]] = []
+        for key, docu_chunk, impl_chunk in sections:
+            if header is not None and header.done():
+                self._write_header(header, pending_docu, writer)
+                header = None
+            if header is None:
+                writer.write_docu(docu_chunk, key)
+            else:
+                pending_docu.append((key, docu_chunk))
+            writer.write_impl(impl_chunk, key)
+        if header is not None:
+            self._write_header(header, pending_docu, writer)
+
+        # writer.write_impl("%    \\begin{macrocode}\n")
+        # writer.write_impl("%    \\end{macrocode}\n")
+        writer.write_impl("% \\iffalse\n")
+        writer.write_impl("%<*package>\n")
+        writer.write_impl("% \\fi\n")
+
+        # writer.write_docu("% \\StopEventually{\\PrintIndex}\n\n")
+        writer.write_docu("\n")
+        writer.write_docu("% \\section{Implementation}\n\n")
+
+    def _assemble_header(self, rsc_dir: Path) -> str:
+        with self.meta_info.profiler.span("add_header"):
+            return self._add_header(rsc_dir)
+
+    def _write_header(
+        self,
+        header: Future[str],
+        pending_docu: list[tuple[str, Chunk]],
+        writer: DtxWriter | MemoryWriter,
+    ):
+        writer.write_docu(header.result())
+        writer.write_docu("% \\section{Macro Documentation}\n")
+        for key, docu_chunk in pending_docu:
+            writer.write_docu(docu_chunk, key)
+        pending_docu.clear()
+
+    def _section_to_dtx(
+        self,
+        key: str,
+        value: Iterable[ParsedObject],
+        progress: None | SectionProgress = None,
+        macros: None | list[MacroSymbol] = None,
+        spool: bool = False,
+        commands: None | list[CommandIR] = None,
+        diagnostics: None | Diagnostics = None,
+    ) -> tuple[Chunk, Chunk]:
+        """
+        Render the documentation and implementation chunk of one section. The symbols of
+        all rendered commands are added to macros and their IR to commands. With spool the
+        parts of the chunks are flushed to temporary files every SPOOL_STEP commands, so a
+        large section is never held in memory as a whole, and the chunks are lists of the files.
+        """
+        cur_docu_output: list[str] = []
+        # cur_docu_output.append(f"% \\subsection{{{key}}}\n")
+        # cur_docu_output.append("% \\etocsettocstyle{}{}\n")
+        # cur_docu_output.append("% \\etocsetnexttocdepth{3}\n")
+        # cur_docu_output.append("% \\localtableofcontents*\n")
+
+        docu_table = ["% \\begin{center}\n"]
+        docu_table.append("% \\begin{tabularx}{\\textwidth}{l p{8cm}} \\hline\n")
+        docu_table.append("% \\textbf{Command} & \\textbf{Arguments} ")
+        docu_table.append("\\\\ \\hline\n")
+        impl_table = ["% \\begin{center}\n"]
+        impl_table.append("% \\begin{tabularx}{\\textwidth}{l p{8cm}} \\hline\n")
+        impl_table.append("% \\textbf{Command} & \\textbf{Arguments} ")
+        impl_table.append("\\\\ \\hline\n")
+
+        cur_impl_output: list[str] = []
+        # cur_impl_output.append(f"% \\subsection{{{key}}}\n")
+        # cur_impl_output.append("% \\etocsettocstyle{}{}\n")
+        # cur_impl_output.append("% \\etocsetnexttocdepth{3}\n")
+        # cur_impl_output.append("% \\localtableofcontents*\n")
+
+        # For private functions
+        footer: list[str] = []
+
+        parts = [docu_table, cur_docu_output, impl_table, cur_impl_output, footer]
+        spools: list[IO[str]] = []
+        if spool:
+            spools = [
+                tempfile.SpooledTemporaryFile(SPOOL_MAX_SIZE, "w+", encoding="utf-8")
+                for _ in parts
+            ]
+
+        profiler = self.meta_info.profiler
+        cancel = self.meta_info.cancel
+        rendered = 0
+        end = 0
+        for obj in value:
+            end = obj.end
+            if obj.o_type == "command" and obj.o_command is not None:
+                if cancel is not None:
+                    cancel.check_commands(self.meta_info.command_count + rendered + 1)
+                cmd = command_ir(obj.o_command)
+                if profiler.commands:
+                    with profiler.span(cmd["name"], COMMAND):
+                        obj_docu, obj_impl = self._render_command(cmd, diagnostics)
+                else:
+                    obj_docu, obj_impl = self._render_command(cmd, diagnostics)
+                rendered += 1
+                if progress is not None and rendered % PROGRESS_STEP == 0:
+                    progress.update(obj.end, PROGRESS_STEP)
+                if macros is not None:
+                    macros.append(macro_symbol(cmd))
+                if commands is not None:
+                    commands.append(cmd)
+                if spools and rendered % SPOOL_STEP == 0:
+                    _flush_parts(parts, spools)
+                if cmd["private"]:
+                    footer.append(obj_impl)
+                else:
+                    cur_docu_output.append(obj_docu)
+                    cur_impl_output.append(obj_impl)
+
+                    if cmd["oarg_default"]:
+                        args_str = f"\\oarg{{{cmd['oarg'][0]}}}, "
                     else:
-                        cur_docu_output += obj_docu
-                        cur_impl_output += obj_impl
-
-                        if cmd["oarg_default"]:
-                            args_str = f"\\oarg{{{cmd["oarg"][0]}}}, "
-                        else:
-                            args_str = ""
-                        args_str += ", ".join([f"\\marg{{{e[0]}}}" for e in cmd["args"]])
-                        docu_table += f"% \\ref{{macro:{cmd['name']}}} & "
-                        docu_table += "\\makecell[t{p{8cm}}]{"
-                        docu_table += f"{args_str}"
-                        if cmd["oarg_default"]:
-                            docu_table += f"\\\\Default Argument: {cmd['oarg_default']}"
-                        docu_table += "} \\\\\n"
-                        # docu_table += f"{args_str} & Another macro description.\\\\\n"
-
-                        impl_table += f"% \\ref{{macro:{cmd['name']}_impl}} & "
-                        impl_table += "\\makecell[t{p{8cm}}]{"
-                        impl_table += f"{args_str}"
-                        if cmd["oarg_default"]:
-                            impl_table += f"\\\\{cmd['oarg_default']}"
-                        impl_table += "} \\\\\n"
-
-            docu_table += "% \\end{tabularx}\n"
-            docu_table += "% \\end{center}\n"
-            impl_table += "% \\end{tabularx}\n"
-            impl_table += "% \\end{center}\n\n"
-            docu_output += f"% \\subsection{{{key}}}\n" + f"% \\label{{subsec:{key}}}\n"
-            docu_output += docu_table + cur_docu_output
-            impl_output += f"% \\subsection{{{key}}}\n" + impl_table + cur_impl_output + footer
-
-        # impl_output += "%    \\begin{macrocode}\n"
-        # impl_output += "%    \\end{macrocode}\n"
-        impl_output += "% \\iffalse\n"
-        impl_output += "%<*package>\n"
-        impl_output += "% \\fi\n"
-
-        output += "% \\section{Macro Documentation}\n"
-        output += docu_output
-        # output += "% \\StopEventually{\\PrintIndex}\n\n"
-        output += "\n"
-        output += "% \\section{Implementation}\n\n"
-        output += impl_output
-
-        return output
+                        args_str = ""
+                    args_str += ", ".join([f"\\marg{{{e[0]}}}" for e in cmd["args"]])
+                    docu_table.append(f"% \\ref{{macro:{cmd['name']}}} & ")
+                    docu_table.append("\\makecell[t{p{8cm}}]{")
+                    docu_table.append(f"{args_str}")
+                    if cmd["oarg_default"]:
+                        docu_table.append(f"\\\\Default Argument: {cmd['oarg_default']}")
+                    docu_table.append("} \\\\\n")
+                    # docu_table.append(f"{args_str} & Another macro description.\\\\\n")
+
+                    impl_table.append(f"% \\ref{{macro:{cmd['name']}_impl}} & ")
+                    impl_table.append("\\makecell[t{p{8cm}}]{")
+                    impl_table.append(f"{args_str}")
+                    if cmd["oarg_default"]:
+                        impl_table.append(f"\\\\{cmd['oarg_default']}")
+                    impl_table.append("} \\\\\n")
+
+        if progress is not None and end > 0:
+            progress.update(end, rendered % PROGRESS_STEP)
+
+        docu_table.append("% \\end{tabularx}\n")
+        docu_table.append("% \\end{center}\n")
+        impl_table.append("% \\end{tabularx}\n")
+        impl_table.append("% \\end{center}\n\n")
+
+        if spools:
+            _flush_parts(parts, spools)
+            docu_spool, cur_docu_spool, impl_spool, cur_impl_spool, footer_spool = spools
+            return (
+                [
+                    f"% \\subsection{{{key}}}\n% \\label{{subsec:{key}}}\n",
+                    docu_spool,
+                    cur_docu_spool,
+                ],
+                [f"% \\subsection{{{key}}}\n", impl_spool, cur_impl_spool, footer_spool],
+            )
+
+        docu_chunk = "".join(
+            [f"% \\subsection{{{key}}}\n", f"% \\label{{subsec:{key}}}\n"]
+            + docu_table
+            + cur_docu_output
+        )
+        impl_chunk = "".join(
+            [f"% \\subsection{{{key}}}\n"] + impl_table + cur_impl_output + footer
+        )
+        return docu_chunk, impl_chunk
 
     def _add_header(self, rsc_dir: Path) -> str:
         header = ""
@@ -240,145 +1034,114 @@ class Converter:
         header += self._fill_template(TEMPLATE_PATH / Path("02_preamble_template.tex"))
         header += self._fill_template(TEMPLATE_PATH / Path("03_postamble_template.tex"))
 
-        pkg_packages_str = ""
-        with open(rsc_dir / "pkg_packages.tex", encoding="utf-8") as f:
-            lines = f.readlines()
-            for line in lines:
-                pkg_packages_str += f"{line}"
-        self.pkg_meta["pkg_packages"] = pkg_packages_str
+        self.pkg_meta["pkg_packages"] = self._read_resource(rsc_dir / "pkg_packages.tex")
         header += self._fill_template(TEMPLATE_PATH / Path("04_generate_template.tex"))
 
         # Load packages (no template)
         # TODO differentiate between packages that are required by the converter
         # and those that are required by the documentation
         # the first should not be user defined
-        with open(rsc_dir / "docu_packages_and_settings.tex", encoding="utf-8") as f:
-            lines = f.readlines()
-            for line in lines:
-                header += line
+        header += self._read_resource(rsc_dir / "docu_packages_and_settings.tex")
         header += "\n"
 
         header += self._fill_template(TEMPLATE_PATH / Path("05_predocument.tex"))
         # header += self._fill_template(TEMPLATE_PATH / Path("06_begin_document_template.tex"))
 
-        introduction_str = ""
-        with open(rsc_dir / "introduction.tex", encoding="utf-8") as f:
-            lines = f.readlines()
-            introduction_str += f"{lines[0]}"
-            for line in lines[1:]:
-                introduction_str += f"    {line}"
-        self.pkg_meta["pkg_introduction"] = introduction_str
-
-        example_str = ""
-        with open(rsc_dir / "example.tex", encoding="utf-8") as f:
-            lines = f.readlines()
-            # TODO this break if the file exists but is empty
-            example_str += f"{lines[0]}"
-            for line in lines[1:]:
-                example_str += f"    {line}"
-        self.pkg_meta["pkg_example"] = example_str
+        self.pkg_meta["pkg_introduction"] = self._read_indented(rsc_dir / "introduction.tex")
+        self.pkg_meta["pkg_example"] = self._read_indented(rsc_dir / "example.tex")
 
         header += self._fill_template(TEMPLATE_PATH / Path("06_document_template.tex"))
         header += "\n"
 
         return header
 
-    def _parse_command(self, command_obj) -> tuple[str, str, ParsedCommand]:
-        obj_docu = ""
-        obj_impl = ""
-
-        command: ParsedCommand = {
-            "name": "unknown",
-            "oarg": ("", ""),
-            "oarg_default": None,
-            "args": [],
-            "desc": [],
-            "todos": [],
-            "errors": [],
-            "equation": [],
-            "example": [],
-            "implementation": [],
-            "private": False,
-        }
-        found_command_start = False
-        for line in command_obj["o_content"]:
-            if line.startswith("\\newcommand"):
-                match = re.search(r"\\newcommand\\(\w+)", line)
-                if match:
-                    # print(match.group(1))
-                    command["name"] = match.group(1)
-                found_command_start = True
-                # command["oarg"] = line.count("[") > 1
-
-                # pattern = re.compile(r"\[\d+\](?:\[([^\]]+)\])?")
-                match = re.search(r"\[\d+\](?:\[([^\]]+)\])?", line)
-                if match:
-                    command["oarg_default"] = match.group(1)
-
-                # print(pattern.search("text[3][Result]").group(1))
-                # print(pattern.search("text[3]").group(1))
-
-            if not found_command_start:
-                if line.startswith("% Private"):
-                    command["private"] = True
-                elif line.startswith("% #"):
-                    match = re.search(r"#\d+\s+([^,]+),\s*(.+)$", line)
-                    if match:
-                        command["args"].append((match.group(1), match.group(2)))
-                elif line.startswith("% TODO"):
-                    command["todos"].append(line)
-                elif line.startswith("% Equation"):
-                    command["equation"].append(line)
-                elif line.startswith("% Example"):
-                    command["example"].append(line)
-                elif line.startswith("% Error"):
-                    command["errors"].append(line)
-                elif line.startswith("% "):
-                    command["desc"].append(line)
-            else:
-                command["implementation"].append(line)
+    def _read_resource(self, file_path: Path) -> str:
+        text = self.resources.read(file_path)
+        if text is None:
+            self._report_missing(file_path)
+            return ""
+        return text
 
-        # Construct command documentation string
-        obj_docu += (
-            f"\n% \\setlabel{{\\textbackslash {command['name']}}}{{macro:{command['name']}}}\n"
+    def _report_missing(self, file_path: Path):
+        self.meta_info.diagnostics.report(
+            MISSING_FILE, "File does not exist.", file=str(file_path)
         )
-        obj_docu += f"% \\DescribeMacro{{{command['name']}}}\n"
 
-        if command["oarg_default"] and len(command["args"]) > 0:
-            command["oarg"] = command["args"][0]
-            command["args"] = command["args"][1:]
+    def _read_indented(self, file_path: Path) -> str:
+        """Read a resource and indent all lines but the first to insert it into a template."""
+        text = self.resources.read(file_path)
+        if text is None:
+            self._report_missing(file_path)
+            return ""
+        lines = split_lines(text)
+        if len(lines) == 0:
+            self.meta_info.diagnostics.report(EMPTY_FILE, "File is empty.", file=str(file_path))
+            return ""
+        return lines[0] + "".join(f"    {line}" for line in lines[1:])
+
+    def _render_command(
+        self, command: CommandIR, diagnostics: None | Diagnostics = None
+    ) -> tuple[str, str]:
+        """
+        Render the documentation and implementation of a command in the dtx, references to
+        parameters that do not exist are reported to diagnostics.
+        """
+        obj_docu: list[str] = []
+        obj_impl: list[str] = []
+
+        name = command["name"]
+        oarg_default = command["oarg_default"]
+        args = command["args"]
+        oarg = command["oarg"]
+        desc = command["desc"]
+        equation = command["equation"]
+        example = command["example"]
+        errors = command["errors"]
 
-        if command["oarg_default"]:
-            obj_docu += f"% \\oarg{{{command['oarg'][0]}}}"
+        # Construct command documentation string
+        obj_docu.append(f"\n% \\setlabel{{\\textbackslash {name}}}{{macro:{name}}}\n")
+        obj_docu.append(f"% \\DescribeMacro{{{name}}}\n")
+
+        if oarg_default:
+            obj_docu.append(f"% \\oarg{{{oarg[0]}}}")
         else:
-            obj_docu += "% "
-        obj_docu += "".join([f"\\marg{{{e[0]}}}" for e in command["args"]])
-        obj_docu += "\\\\[1mm]\n"
-
-        if command["oarg_default"]:
-            obj_docu += f"% \\oarg{{{command['oarg'][0]}}}: {command['oarg'][1]}, "
-            obj_docu += f"default: {command['oarg_default']}\\\\\n"
-        for arg in command["args"]:
-            obj_docu += f"% \\marg{{{arg[0]}}}: {arg[1]}"
-            if not arg == command["args"][-1]:
-                obj_docu += "\\\\\n"
+            obj_docu.append("% ")
+        obj_docu.append("".join([f"\\marg{{{e[0]}}}" for e in args]))
+        obj_docu.append("\\\\[1mm]\n")
+
+        if oarg_default:
+            obj_docu.append(f"% \\oarg{{{oarg[0]}}}: {oarg[1]}, ")
+            obj_docu.append(f"default: {oarg_default}\\\\\n")
+        for arg in args:
+            obj_docu.append(f"% \\marg{{{arg[0]}}}: {arg[1]}")
+            if not arg == args[-1]:
+                obj_docu.append("\\\\\n")
             else:
-                obj_docu += "\n"
-        # obj_docu += "\n"
-        # obj_docu += "".join(command["desc"])
-        # obj_docu += "\n"
+                obj_docu.append("\n")
+        # obj_docu.append("\n")
+        # obj_docu.append("".join(desc))
+        # obj_docu.append("\n")
+
+        # The parameters a number in the documentation text refers to
+        options = args
+        if oarg_default:
+            options = [oarg] + options
+
+        def report_param(n: int):
+            if diagnostics is not None:
+                diagnostics.report(
+                    PARAM_OUT_OF_RANGE,
+                    f"Replacement error: {name} has no parameter #{n}.",
+                    command["line"],
+                )
 
         # TODO
         # Filter documentation text for param numbers (e.g. #2)
         def replace_match_short(match):
             n = int(match.group(1))
 
-            options = command["args"]
-            if command["oarg_default"]:
-                options = [command["oarg"]] + options
-
             if n - 1 >= len(options):
-                print(f"Replacement error: list not long enough {command['name']}")
+                report_param(n)
                 return f"param {n}"
 
             var_components = options[n - 1][0].split(" ")
@@ -420,84 +1183,95 @@ class Converter:
 
             return var_name
 
-        box_added = False
-        if len(command["desc"]) > 0:
-            obj_docu += self._add_description_box(command["desc"])
-            box_added = True
-        if len(command["equation"]) > 0:
-            tmp_str = self._add_equation_box(command["equation"])
-            tmp_str = re.sub(r"#(\d+)", replace_match_short, tmp_str)
-            obj_docu += tmp_str
-            box_added = True
-        if len(command["example"]) > 0:
-            obj_docu += self._add_example_box(command["example"])
-            box_added = True
-        if len(command["errors"]) > 0:
-            obj_docu += self._add_warning_box(command["errors"])
-            box_added = True
-
-        if not box_added:
-            obj_docu += "\n"
-
         # Filter documentation text for param numbers (e.g. #2)
         def replace_match(match):
             n = int(match.group(1))
 
-            options = command["args"]
-            if command["oarg_default"]:
-                options = [command["oarg"]] + options
-
             if n - 1 >= len(options):
-                print(f"Replacement error: list not long enough {command['name']}")
+                report_param(n)
                 return f"param {n}"
             return options[n - 1][0]
 
-        obj_docu = re.sub(r"#(\d+)", replace_match, obj_docu)
+        box_added = False
+        equation_idx = None
+        if len(desc) > 0:
+            obj_docu.append(self._add_description_box(desc))
+            box_added = True
+        if len(equation) > 0:
+            # The box is excluded from the substitution below, so the replacements of
+            # replace_match_short are filtered right away
+            tmp_str = PARAM_PATTERN.sub(
+                lambda match: PARAM_PATTERN.sub(replace_match, replace_match_short(match)),
+                self._add_equation_box(equation),
+            )
+            equation_idx = len(obj_docu)
+            obj_docu.append(tmp_str)
+            box_added = True
+        if len(example) > 0:
+            obj_docu.append(self._add_example_box(example))
+            box_added = True
+        if len(errors) > 0:
+            obj_docu.append(self._add_warning_box(errors))
+            box_added = True
+
+        if not box_added:
+            obj_docu.append("\n")
+
+        if equation_idx is None:
+            docu_str = PARAM_PATTERN.sub(replace_match, "".join(obj_docu))
+        else:
+            docu_str = "".join(
+                [PARAM_PATTERN.sub(replace_match, "".join(obj_docu[:equation_idx]))]
+                + [obj_docu[equation_idx]]
+                + [PARAM_PATTERN.sub(replace_match, "".join(obj_docu[equation_idx + 1 :]))]
+            )
 
         # Construct command implementation string
-        obj_impl += (
-            f"\n% \\setlabel{{\\textbackslash {command['name']}}}{{macro:{command['name']}_impl}}"
-        )
-        obj_impl += "\n"
-        obj_impl += f"% \\begin{{macro}}{{\\{command['name']}}}\n"
+        obj_impl.append(f"\n% \\setlabel{{\\textbackslash {name}}}{{macro:{name}_impl}}")
+        obj_impl.append("\n")
+        obj_impl.append(f"% \\begin{{macro}}{{\\{name}}}\n")
 
-        desc_str = "".join(command["desc"]) + "% \n"
-        obj_impl += re.sub(r"#(\d+)", replace_match, desc_str)
+        desc_str = "".join(desc) + "% \n"
+        obj_impl.append(PARAM_PATTERN.sub(replace_match, desc_str))
 
         param_n = 1
-        if command["oarg_default"]:
-            obj_impl += f"% \\#{param_n} - {command['oarg'][0]}: "
-            obj_impl += f"{command['oarg'][1].replace("#", "\\#")}\\\\\n"
+        if oarg_default:
+            obj_impl.append(f"% \\#{param_n} - {oarg[0]}: ")
+            obj_impl.append(f"{oarg[1].replace("#", "\\#")}\\\\\n")
             param_n += 1
-        for arg in command["args"]:
-            obj_impl += f"% \\#{param_n} - {arg[0]}: {arg[1].replace("#", "\\#")}"
+        for arg in args:
+            obj_impl.append(f"% \\#{param_n} - {arg[0]}: {arg[1].replace("#", "\\#")}")
             param_n += 1
-            if not arg == command["args"][-1]:
-                obj_impl += "\\\\\n"
+            if not arg == args[-1]:
+                obj_impl.append("\\\\\n")
             else:
-                obj_impl += "\n"
+                obj_impl.append("\n")
 
-        obj_impl += "%    \\begin{macrocode}\n"
+        obj_impl.append("%    \\begin{macrocode}\n")
 
-        obj_impl += "".join(command["implementation"])
+        obj_impl.append("".join(command["implementation"]))
 
-        obj_impl += "%    \\end{macrocode}\n"
-        obj_impl += "% \\end{macro}\n\n"
+        obj_impl.append("%    \\end{macrocode}\n")
+        obj_impl.append("% \\end{macro}\n\n")
 
-        return obj_docu, obj_impl, command
+        return docu_str, "".join(obj_impl)
 
     def _fill_template(self, file_path: Path) -> str:
-        # Read the entire file into one string
-        if file_path.exists():
-            result: str = file_path.read_text(encoding="utf-8")
-
-            for key, value in self.pkg_meta.items():
-                result = result.replace(f"<{key.upper()}>", f"{value}")
-            return result
-        else:
-            print(f"File {file_path} does not exist.")
+        template = self.resources.template(file_path)
+        if template is None:
+            self.meta_info.diagnostics.report(
+                MISSING_FILE, "Template does not exist.", file=str(file_path)
+            )
             return ""
 
+        values = {key.upper(): value for key, value in self.pkg_meta.items()}
+        result, missing = template.render(values)
+        for key in missing:
+            self.meta_info.diagnostics.report(
+                MISSING_PLACEHOLDER, f"No value for placeholder <{key}>.", file=str(file_path)
+            )
+        return result
+
     def _add_description_box(self, desc_strs: list[str]) -> str:
         description = "% \\begin{descriptionbox}\n"
         description += "".join(desc_strs)
@@ -543,3 +1317,62 @@ class Converter:
         warning += "% \\end{warningbox}\n"
 
         return warning
+
+
+def _convert_section_worker(
+    section_name: str,
+    file_dir: Path,
+    profiling: tuple[bool, bool],
+    progress_events: Any = None,
+    limits: None | tuple[None | float, None | int] = None,
+    collect_ir: bool = False,
+) -> tuple[SectionFragments, list[Span]]:
+    """Worker entry point: convert a single section file and return the recorded spans."""
+    meta_info = MetaInformation()
+    meta_info.set_profiling(*profiling)
+    if progress_events is not None:
+        meta_info.progress = ProgressChannel(progress_events)
+    if limits is not None:
+        meta_info.cancel = CancelToken.for_worker(limits, _worker_cancel_event)
+    # Spooled files can not be sent to the parent, the chunks are returned as text
+    fragments = Converter(meta_info)._convert_section(
+        section_name, file_dir, collect_ir=collect_ir
+    )
+    return fragments, meta_info.profiler.spans
+
+
+# Cancellation event of the conversion the worker process was started for
+_worker_cancel_event: Any = None
+
+
+def worker_pool(jobs: int, cancel: None | CancelToken = None) -> Executor:
+    """
+    Process pool for the section files, its workers see the cancellation of the given token.
+    A pool shared by several conversions must only be used by one of them at a time with
+    tokens sharing this event, otherwise the workers only enforce the limits.
+    """
+    # Imported here, it pulls in multiprocessing and slows down importing the core
+    from concurrent.futures import ProcessPoolExecutor
+
+    return ProcessPoolExecutor(
+        max_workers=jobs,
+        initializer=_init_worker,
+        initargs=(None if cancel is None else cancel.event,),
+    )
+
+
+def _init_worker(cancel_event: Any):
+    """Initializer of the worker processes, the event can only be passed on at their start."""
+    global _worker_cancel_event
+    _worker_cancel_event = cancel_event
+
+
+def _flush_parts(parts: list[list[str]], spools: list[IO[str]]):
+    for part, spool in zip(parts, spools):
+        spool.write("".join(part))
+        part.clear()
+
+
+def shard_name(pkg_name: str, section_name: str, part: str) -> str:
+    """File name of the documentation or implementation part of a section in sharded mode."""
+    return f"{pkg_name}_{section_name}_{part}.dtx"
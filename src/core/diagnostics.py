@@ -0,0 +1,125 @@
+import json
+from collections import Counter
+from pathlib import Path
+from typing import TypedDict
+
+from core.cancel import ConversionCancelled
+
+# Severities, only warnings count towards the limit
+ERROR = "error"
+WARNING = "warning"
+INFO = "info"
+
+# Codes of the diagnostics
+UNPROCESSED_LINE = "unprocessed-line"
+PARAM_OUT_OF_RANGE = "param-out-of-range"
+MALFORMED_BOX = "malformed-box"
+UNNAMED_COMMAND = "unnamed-command"
+DUPLICATE_MACRO = "duplicate-macro"
+UNKNOWN_FILE = "unknown-file"
+DUPLICATE_SECTION = "duplicate-section"
+MISSING_FILE = "missing-file"
+EMPTY_FILE = "empty-file"
+MISSING_PLACEHOLDER = "missing-placeholder"
+
+
+class Diagnostic(TypedDict):
+    code: str
+    severity: str
+    message: str
+    file: None | str
+    # Line number in the file, starting at 1
+    line: None | int
+
+
+class Diagnostics:
+    """
+    Collects the problems found during a conversion instead of printing them right away,
+    they are printed at once by flush. Exceeding max_warnings cancels the conversion.
+    """
+
+    def __init__(self, max_warnings: None | int = None, file: None | str = None):
+        self.max_warnings = max_warnings
+        # File of all diagnostics that are reported without one
+        self.file = file
+        self.entries: list[Diagnostic] = []
+        self.warnings = 0
+
+    def report(
+        self,
+        code: str,
+        message: str,
+        line: None | int = None,
+        severity: str = WARNING,
+        file: None | str = None,
+    ):
+        self.add(
+            {
+                "code": code,
+                "severity": severity,
+                "message": message,
+                "file": self.file if file is None else file,
+                "line": line,
+            }
+        )
+
+    def add(self, diagnostic: Diagnostic):
+        self.entries.append(diagnostic)
+        if diagnostic["severity"] == WARNING:
+            self.warnings += 1
+            if self.max_warnings is not None and self.warnings > self.max_warnings:
+                raise ConversionCancelled(
+                    f"Conversion exceeded the limit of {self.max_warnings} warnings."
+                )
+
+    def extend(self, diagnostics: list[Diagnostic], check: bool = True):
+        """Add the diagnostics of a section, without check the limit is not enforced."""
+        for diagnostic in diagnostics:
+            if check:
+                self.add(diagnostic)
+            else:
+                self.entries.append(diagnostic)
+                self.warnings += diagnostic["severity"] == WARNING
+
+    def section(self, file: str) -> "Diagnostics":
+        """Collector for a single section file, the warnings so far count towards its limit."""
+        section = Diagnostics(self.max_warnings, file)
+        section.warnings = self.warnings
+        return section
+
+    def counts(self) -> Counter[str]:
+        return Counter(diagnostic["severity"] for diagnostic in self.entries)
+
+    def clear(self):
+        self.entries = []
+        self.warnings = 0
+
+    def format(self) -> str:
+        """All diagnostics, one per line, and a summary."""
+        lines = []
+        for diagnostic in self.entries:
+            location = ""
+            if diagnostic["file"] is not None:
+                location = diagnostic["file"]
+                if diagnostic["line"] is not None:
+                    location += f":{diagnostic['line']}"
+                location += ": "
+            lines.append(
+                f"{location}{diagnostic['severity']}: {diagnostic['message']} "
+                f"[{diagnostic['code']}]\n"
+            )
+        counts = self.counts()
+        if counts[ERROR] or counts[WARNING]:
+            lines.append(f"{counts[ERROR]} errors, {counts[WARNING]} warnings.\n")
+        return "".join(lines)
+
+    def flush(self):
+        """Print all diagnostics at once."""
+        text = self.format()
+        if text:
+            print(text, end="")
+
+    def export_json(self, file_path: Path):
+        with open(file_path, "w", encoding="utf-8") as f:
+            json.dump(self.entries, f, indent=1)
+            f.write("\n")
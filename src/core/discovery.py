@@ -0,0 +1,86 @@
+import fnmatch
+import os
+import re
+from pathlib import Path
+from typing import TypedDict
+
+# Modification time in ns and size of a file, a file with the same stat counts as unchanged
+FileStat = tuple[int, int]
+
+# Patterns of the section files
+DEFAULT_INCLUDE = ["*.tex"]
+# The header resources, the package config and hidden files or directories are no sections
+DEFAULT_EXCLUDE = ["docu", "package_config.txt", ".*"]
+
+
+class SourceFiles(TypedDict):
+    # Section files by their section name, in the order of their paths
+    sections: dict[str, Path]
+    # Files that are neither included nor excluded
+    unmatched: list[Path]
+    # Section files replaced by a later file with the same section name
+    replaced: list[Path]
+    # Stat of the section files by their section name
+    stats: dict[str, FileStat]
+
+
+def section_name(file_name: str) -> str:
+    """The section of a file named <number>_<section>.tex, otherwise the stem of the file."""
+    stem = os.path.splitext(file_name)[0]
+    parts = stem.split("_")
+    return parts[1] if len(parts) > 1 and parts[1] else stem
+
+
+def discover(
+    rsc_dir: Path,
+    include: None | list[str] = None,
+    exclude: None | list[str] = None,
+    ignore: None | list[Path] = None,
+) -> SourceFiles:
+    """
+    Find the section files in the resource dir and all its subdirectories in one pass.
+    A pattern without a slash matches the names of files and directories at any depth, one
+    with a slash the path relative to the resource dir. Excluded directories are not entered,
+    the ignored paths (e.g. a target dir inside the resource dir) neither.
+    Entries are visited sorted by name, so the sections are in the order of their paths.
+    """
+    include_match = _compile(DEFAULT_INCLUDE if include is None else include)
+    exclude_match = _compile(DEFAULT_EXCLUDE if exclude is None else exclude)
+    ignored = {os.path.abspath(path) for path in ignore or []}
+    files: SourceFiles = {"sections": {}, "unmatched": [], "replaced": [], "stats": {}}
+
+    def scan(directory: str, prefix: str):
+        with os.scandir(directory) as it:
+            entries = sorted(it, key=lambda entry: entry.name)
+        for entry in entries:
+            rel_path = prefix + entry.name
+            if exclude_match(entry.name) or exclude_match(rel_path):
+                continue
+            if entry.is_dir(follow_symlinks=False):
+                if os.path.abspath(entry.path) not in ignored:
+                    scan(entry.path, rel_path + "/")
+                continue
+            if not entry.is_file():
+                continue
+
+            file_dir = Path(entry.path)
+            if not (include_match(entry.name) or include_match(rel_path)):
+                files["unmatched"].append(file_dir)
+                continue
+            name = section_name(entry.name)
+            # A later file with the same section name replaces the earlier one
+            if name in files["sections"]:
+                files["replaced"].append(files["sections"][name])
+            files["sections"][name] = file_dir
+            stat = entry.stat()
+            files["stats"][name] = (stat.st_mtime_ns, stat.st_size)
+
+    scan(str(rsc_dir), "")
+    return files
+
+
+def _compile(patterns: list[str]):
+    """Match function of all glob patterns at once."""
+    if len(patterns) == 0:
+        return lambda path: False
+    return re.compile("|".join(fnmatch.translate(pattern) for pattern in patterns)).match
@@ -0,0 +1,104 @@
+import re
+from collections.abc import Mapping
+from typing import TypedDict
+
+from core.tex_parser import (
+    DESC_FIELD,
+    EQUATION_FIELD,
+    ERROR_FIELD,
+    EXAMPLE_FIELD,
+    TODO_FIELD,
+    ParsedCommand,
+)
+
+# Parameter numbers in documentation text (e.g. #2)
+PARAM_PATTERN = re.compile(r"#(\d+)")
+
+
+class CommandIR(TypedDict):
+    """
+    A command of a section as it was parsed. The documentation and implementation lines
+    are kept as they are in the source, the backends decide how to present them.
+    """
+
+    name: str
+    line: int
+    private: bool
+    # Name and description of the optional argument, empty if it has no default value
+    oarg: tuple[str, str]
+    oarg_default: None | str
+    args: list[tuple[str, str]]
+    desc: list[str]
+    equation: list[str]
+    example: list[str]
+    errors: list[str]
+    todos: list[str]
+    implementation: list[str]
+
+
+class SectionIR(TypedDict):
+    name: str
+    file: str
+    commands: list[CommandIR]
+
+
+class PackageIR(TypedDict):
+    """The whole package, every output backend renders from it."""
+
+    name: str
+    version: str
+    date: str
+    author: str
+    author_email: str
+    description: str
+    info_text: str
+    sections: list[SectionIR]
+
+
+def command_ir(command: ParsedCommand) -> CommandIR:
+    """Decode all fields of a parsed command once."""
+    fields = command.fields()
+    return {
+        "name": command.name,
+        "line": command.line,
+        "private": command.private,
+        "oarg": command.oarg,
+        "oarg_default": command.oarg_default,
+        "args": command.args,
+        "desc": fields[DESC_FIELD],
+        "equation": fields[EQUATION_FIELD],
+        "example": fields[EXAMPLE_FIELD],
+        "errors": fields[ERROR_FIELD],
+        "todos": fields[TODO_FIELD],
+        "implementation": command.implementation,
+    }
+
+
+def package_ir(pkg_meta: Mapping[str, str | float], sections: list[SectionIR]) -> PackageIR:
+    return {
+        "name": str(pkg_meta["pkg_name"]),
+        "version": str(pkg_meta["pkg_version"]),
+        "date": str(pkg_meta["pkg_date"]),
+        "author": str(pkg_meta["pkg_author"]),
+        "author_email": str(pkg_meta["pkg_author_email"]),
+        "description": str(pkg_meta["pkg_description"]),
+        "info_text": str(pkg_meta["pkg_info_text"]),
+        "sections": sections,
+    }
+
+
+def signature(command: CommandIR) -> str:
+    """The arguments of the command as they are written, e.g. [scale]{vector v}."""
+    text = f"[{command['oarg'][0]}]" if command["oarg_default"] else ""
+    return text + "".join(f"{{{arg[0]}}}" for arg in command["args"])
+
+
+def doc_text(line: str, keyword: str = "") -> str:
+    """
+    The text of a documentation line without the comment sign and the keyword it starts
+    with, e.g. "% Equation: a + b" is "a + b" for the keyword "Equation".
+    """
+    text = line[2:] if line.startswith("% ") else line.lstrip("%")
+    if keyword and text.startswith(keyword):
+        text = text[len(keyword) :].removeprefix(":")
+    return text.strip()
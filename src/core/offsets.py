@@ -0,0 +1,108 @@
+import hashlib
+import json
+from pathlib import Path
+from typing import TypedDict
+
+from core.discovery import FileStat
+from core.writer import file_digest, write_if_changed
+
+OFFSET_INDEX_NAME = ".tex2dtx_offsets.json"
+# Increase whenever the layout of the index changes, older indexes are ignored
+OFFSET_INDEX_VERSION = 2
+
+
+class SectionOffsets(TypedDict):
+    name: str
+    file: str
+    # Hash of the content of the section file the chunks were rendered from
+    digest: str
+    # Stat of the section file when it was hashed, the file is not hashed again while it matches
+    stat: FileStat
+    # Byte ranges [start, end) of the documentation and implementation chunk in the dtx
+    docu: tuple[int, int]
+    impl: tuple[int, int]
+
+
+class OffsetIndex(TypedDict):
+    """Sidecar of a dtx file that locates the chunks of every section in it."""
+
+    version: int
+    # Hash of everything besides the sections the dtx depends on, e.g. templates and config
+    fingerprint: str
+    output: str
+    size: int
+    digest: str
+    sections: list[SectionOffsets]
+
+
+def section_digest(file_dir: Path) -> str:
+    return file_digest(file_dir).hex()
+
+
+def load_offset_index(index_path: Path) -> None | OffsetIndex:
+    """The index stored at the path, None if it is missing, broken or of another version."""
+    try:
+        with open(index_path, encoding="utf-8") as f:
+            index: OffsetIndex = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if not isinstance(index, dict) or index.get("version") != OFFSET_INDEX_VERSION:
+        return None
+    return index
+
+
+def write_offset_index(index_path: Path, index: OffsetIndex):
+    write_if_changed(index_path, json.dumps(index, indent=1) + "\n")
+
+
+def stale_reason(
+    index: None | OffsetIndex, output_file: Path, fingerprint: str, section_files: dict[str, Path]
+) -> None | str:
+    """Why the index does not describe the output file and sections, None if it does."""
+    if index is None:
+        return "No offset index found."
+    if index["output"] != output_file.name or index["fingerprint"] != fingerprint:
+        return "The templates or package config changed."
+    if [(section["name"], section["file"]) for section in index["sections"]] != [
+        (name, str(file_dir)) for name, file_dir in section_files.items()
+    ]:
+        return "Section files were added, removed or renamed."
+    try:
+        if output_file.stat().st_size != index["size"]:
+            return f"{output_file.name} was changed since the last conversion."
+    except FileNotFoundError:
+        return f"{output_file.name} does not exist."
+    if file_digest(output_file).hex() != index["digest"]:
+        return f"{output_file.name} was changed since the last conversion."
+    return None
+
+
+def shift_ranges(index: OffsetIndex, new_sizes: dict[tuple[str, str], int]):
+    """
+    Move the ranges of all sections after the given chunks were replaced by chunks of the
+    new sizes, keyed by section name and "docu" or "impl".
+    """
+    ranges = [
+        (section[part][0], section[part][1], section, part)
+        for section in index["sections"]
+        for part in ("docu", "impl")
+    ]
+    shift = 0
+    for start, end, section, part in sorted(ranges, key=lambda entry: entry[0]):
+        size = new_sizes.get((section["name"], part), end - start)
+        if part == "docu":
+            section["docu"] = (start + shift, start + shift + size)
+        else:
+            section["impl"] = (start + shift, start + shift + size)
+        shift += size - (end - start)
+
+
+def fingerprint(paths: list[Path], values: dict[str, str | float]) -> str:
+    """Hash of the given files and values, missing files are hashed by their name only."""
+    sha = hashlib.sha256()
+    for path in paths:
+        sha.update(path.name.encode())
+        if path.is_file():
+            sha.update(path.read_bytes())
+    sha.update(json.dumps(values, sort_keys=True, default=str).encode())
+    return sha.hexdigest()
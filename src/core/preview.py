@@ -0,0 +1,147 @@
+import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import TypedDict
+
+from core.converter import Converter
+from core.discovery import FileStat, discover
+from core.ir import command_ir
+from core.source import SourceBuffer, open_source
+from core.tex_parser import iter_source
+from core.writer import chunk_text
+from meta_information import MetaInformation
+
+# Number of rendered fragments kept by the preview
+PREVIEW_CACHE_SIZE = 256
+
+
+class MacroOutline(TypedDict):
+    name: str
+    line: int
+    private: bool
+    # Byte range of the command and its documentation in the section file
+    start: int
+    end: int
+
+
+class SectionOutline(TypedDict):
+    name: str
+    file: Path
+    # Stat of the file the outline was made from, the byte ranges are only valid for it
+    stat: FileStat
+    macros: list[MacroOutline]
+
+
+def outline_section(section_name: str, file_dir: Path, stat: FileStat) -> SectionOutline:
+    """List the macros of a section file, only parsing it without rendering anything."""
+    with open_source(file_dir) as source:
+        macros: list[MacroOutline] = [
+            {
+                "name": obj.o_command.name,
+                "line": obj.o_command.line,
+                "private": obj.o_command.private,
+                "start": obj.start,
+                "end": obj.end,
+            }
+            for obj in iter_source(source)
+            if obj.o_type == "command" and obj.o_command is not None
+        ]
+    return {"name": section_name, "file": file_dir, "stat": stat, "macros": macros}
+
+
+class PreviewRenderer:
+    """
+    Renders single macros or sections of a package on demand instead of the whole dtx.
+    A macro is parsed again from its byte range only, so its cost does not depend on the
+    size of its section. The most recently rendered fragments are kept, keyed by the stat
+    of their file, so fragments of changed files are rendered again.
+    """
+
+    def __init__(self, meta_info: MetaInformation, max_entries: int = PREVIEW_CACHE_SIZE):
+        self.meta_info = meta_info
+        self.converter = Converter(meta_info)
+        self.max_entries = max_entries
+        self.sections: dict[str, SectionOutline] = {}
+        self._fragments: OrderedDict[tuple[str, FileStat, None | int], str] = OrderedDict()
+        # Rendering runs in the background while the cache is looked up by the GUI
+        self._lock = threading.Lock()
+
+    def load(self) -> list[SectionOutline]:
+        """Find and outline all section files of the package."""
+        files = discover(
+            self.meta_info.rsc_dir,
+            self.meta_info.include,
+            self.meta_info.exclude,
+            [self.meta_info.tgt_dir],
+        )
+        self.sections = {
+            key: outline_section(key, file_dir, files["stats"][key])
+            for key, file_dir in files["sections"].items()
+        }
+        return list(self.sections.values())
+
+    def outline(self, section_name: str) -> SectionOutline:
+        """The outline of the section, made again if its file changed since."""
+        section = self.sections[section_name]
+        stat = os.stat(section["file"])
+        if (stat.st_mtime_ns, stat.st_size) != section["stat"]:
+            section = outline_section(
+                section_name, section["file"], (stat.st_mtime_ns, stat.st_size)
+            )
+            self.sections[section_name] = section
+        return section
+
+    def cached(self, section_name: str, macro: None | int = None) -> None | str:
+        """The fragment if it was rendered before and its file did not change since."""
+        section = self.sections.get(section_name)
+        if section is None:
+            return None
+        stat = os.stat(section["file"])
+        if (stat.st_mtime_ns, stat.st_size) != section["stat"]:
+            return None
+        with self._lock:
+            key = self._key(section, macro)
+            fragment = self._fragments.get(key)
+            if fragment is not None:
+                self._fragments.move_to_end(key)
+            return fragment
+
+    def render(self, section_name: str, macro: None | int = None) -> str:
+        """
+        Render the documentation and implementation of the macro with the given index in
+        the outline of the section, or of the whole section.
+        """
+        section = self.outline(section_name)
+        key = self._key(section, macro)
+        with self._lock:
+            fragment = self._fragments.get(key)
+            if fragment is not None:
+                self._fragments.move_to_end(key)
+                return fragment
+
+        if macro is None:
+            fragments = self.converter._convert_section(section_name, section["file"])
+            fragment = chunk_text(fragments["docu"]) + chunk_text(fragments["impl"])
+        else:
+            fragment = self._render_macro(section, section["macros"][macro])
+
+        with self._lock:
+            self._fragments[key] = fragment
+            while len(self._fragments) > self.max_entries:
+                self._fragments.popitem(last=False)
+        return fragment
+
+    def _render_macro(self, section: SectionOutline, macro: MacroOutline) -> str:
+        with open(section["file"], "rb") as f:
+            f.seek(macro["start"])
+            data = f.read(macro["end"] - macro["start"])
+        for obj in iter_source(SourceBuffer(section["file"], data)):
+            if obj.o_type == "command" and obj.o_command is not None:
+                docu, impl = self.converter._render_command(command_ir(obj.o_command))
+                return docu + impl
+        raise ValueError(f"Macro {macro['name']} is not defined at line {macro['line']}.")
+
+    @staticmethod
+    def _key(section: SectionOutline, macro: None | int) -> tuple[str, FileStat, None | int]:
+        return str(section["file"]), section["stat"], macro
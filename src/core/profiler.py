@@ -0,0 +1,133 @@
+import contextlib
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Any, TypedDict
+
+# Span categories
+STAGE = "stage"
+SECTION = "section"
+COMMAND = "command"
+
+
+class Span(TypedDict):
+    name: str
+    cat: str
+    start: int
+    duration: int
+    pid: int
+    tid: int
+    args: dict[str, Any]
+
+
+class _SpanContext:
+    __slots__ = ("profiler", "name", "cat", "args", "start")
+
+    def __init__(self, profiler: "Profiler", name: str, cat: str, args: dict[str, Any]):
+        self.profiler = profiler
+        self.name = name
+        self.cat = cat
+        self.args = args
+        self.start = 0
+
+    def __enter__(self):
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        end = time.perf_counter_ns()
+        self.profiler.spans.append(
+            {
+                "name": self.name,
+                "cat": self.cat,
+                "start": self.start,
+                "duration": end - self.start,
+                "pid": os.getpid(),
+                "tid": threading.get_ident(),
+                "args": self.args,
+            }
+        )
+
+
+_NULL_SPAN = contextlib.nullcontext()
+
+
+class Profiler:
+    """
+    Collects timing spans around the stages of a conversion.
+    When disabled, span() returns a shared no-op context, so the overhead is one call.
+    """
+
+    def __init__(self, enabled: bool = False, commands: bool = False):
+        self.enabled = enabled
+        # Also record one span per command, this has a noticeable overhead
+        self.commands = enabled and commands
+        self.spans: list[Span] = []
+
+    def span(self, name: str, cat: str = STAGE, **args: Any):
+        if not self.enabled:
+            return _NULL_SPAN
+        return _SpanContext(self, name, cat, args)
+
+    def clear(self):
+        self.spans = []
+
+    def stage_totals(self) -> dict[str, float]:
+        """
+        Sum of the self times of all stage spans by name in seconds. The self time of a stage
+        excludes the stages nested in it on the same thread, e.g. the sections parsed while
+        the dtx is written, so no time is counted twice.
+        """
+        stages = sorted(
+            (span for span in self.spans if span["cat"] == STAGE),
+            key=lambda span: (span["pid"], span["tid"], span["start"], -span["duration"]),
+        )
+        self_times = [span["duration"] for span in stages]
+        # Indices of the enclosing stages of the current one
+        stack: list[int] = []
+        for index, span in enumerate(stages):
+            while stack and not _contains(stages[stack[-1]], span):
+                stack.pop()
+            if stack:
+                self_times[stack[-1]] -= span["duration"]
+            stack.append(index)
+
+        totals: dict[str, float] = {}
+        for span, self_time in zip(stages, self_times):
+            totals[span["name"]] = totals.get(span["name"], 0) + self_time / 1e9
+        return totals
+
+    def stage_summary(self, separator: str = ", ") -> str:
+        return separator.join(
+            f"{name}: {duration * 1000:.1f} ms" for name, duration in self.stage_totals().items()
+        )
+
+    def export_chrome_trace(self, file_path: Path):
+        """Write all spans as complete events in the Chrome trace event format."""
+        origin = min((span["start"] for span in self.spans), default=0)
+        events = [
+            {
+                "name": span["name"],
+                "cat": span["cat"],
+                "ph": "X",
+                "ts": (span["start"] - origin) / 1000,
+                "dur": span["duration"] / 1000,
+                "pid": span["pid"],
+                "tid": span["tid"],
+                "args": span["args"],
+            }
+            for span in self.spans
+        ]
+        with open(file_path, "w", encoding="utf-8") as f:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f)
+
+
+def _contains(outer: Span, inner: Span) -> bool:
+    return (
+        outer["pid"] == inner["pid"]
+        and outer["tid"] == inner["tid"]
+        and outer["start"] <= inner["start"]
+        and inner["start"] + inner["duration"] <= outer["start"] + outer["duration"]
+    )
@@ -0,0 +1,180 @@
+import multiprocessing
+import queue
+import threading
+import time
+from typing import Any, TypedDict
+
+# Event kinds
+START = "start"
+ADVANCE = "advance"
+SECTION = "section"
+FINISH = "finish"
+
+# Number of objects parsed or commands rendered between two advance events of a section
+PROGRESS_STEP = 256
+
+
+class ProgressEvent(TypedDict):
+    kind: str
+    section: str
+    # START: total work in bytes, ADVANCE: work done since the last event
+    bytes: int
+    # START: number of sections, ADVANCE: commands rendered since the last event
+    count: int
+    # FINISH: the error the conversion failed with
+    error: None | str
+
+
+def _event(
+    kind: str, section: str = "", size: int = 0, count: int = 0, error: None | str = None
+) -> ProgressEvent:
+    return {"kind": kind, "section": section, "bytes": size, "count": count, "error": error}
+
+
+class ProgressChannel:
+    """
+    Thread-safe queue of progress events fed by the converter.
+
+    Every byte of a section file is counted twice, once when it is parsed and once when it
+    is rendered, so a single large section advances steadily. Worker processes report
+    through a multiprocessing queue whose events are relayed into this channel.
+    """
+
+    def __init__(self, events: Any = None):
+        # Either a local queue or the queue of a worker process
+        self.events = queue.Queue() if events is None else events
+        self._manager: Any = None
+        self._worker_events: Any = None
+        self._relay: None | threading.Thread = None
+
+    def put(self, event: ProgressEvent):
+        self.events.put(event)
+
+    def start(self, total_bytes: int, sections: int):
+        self.put(_event(START, size=2 * total_bytes, count=sections))
+
+    def advance(self, section: str, size: int, commands: int = 0):
+        self.put(_event(ADVANCE, section, size, commands))
+
+    def section_done(self, section: str):
+        self.put(_event(SECTION, section))
+
+    def finish(self, error: None | str = None):
+        self.close_worker_queue()
+        self.put(_event(FINISH, error=error))
+
+    def drain(self) -> list[ProgressEvent]:
+        """Return all pending events without blocking."""
+        events = []
+        while True:
+            try:
+                events.append(self.events.get_nowait())
+            except queue.Empty:
+                return events
+
+    def get(self, timeout: None | float = None) -> None | ProgressEvent:
+        """Wait for the next event, returns None on timeout."""
+        try:
+            return self.events.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def worker_queue(self) -> Any:
+        """A queue worker processes can report to, its events are relayed to this channel."""
+        if self._worker_events is None:
+            self._manager = multiprocessing.Manager()
+            self._worker_events = self._manager.Queue()
+            self._relay = threading.Thread(target=self._relay_events, daemon=True)
+            self._relay.start()
+        return self._worker_events
+
+    def close_worker_queue(self):
+        if self._worker_events is None:
+            return
+        self._worker_events.put(None)
+        if self._relay is not None:
+            self._relay.join()
+        self._manager.shutdown()
+        self._manager = None
+        self._worker_events = None
+        self._relay = None
+
+    def _relay_events(self):
+        while (event := self._worker_events.get()) is not None:
+            self.put(event)
+
+
+class SectionProgress:
+    """Turns the offsets one pass over a section file reached into advance events."""
+
+    __slots__ = ("channel", "section", "offset")
+
+    def __init__(self, channel: ProgressChannel, section: str):
+        self.channel = channel
+        self.section = section
+        self.offset = 0
+
+    def update(self, offset: int, commands: int = 0):
+        if offset > self.offset or commands > 0:
+            self.channel.advance(self.section, offset - self.offset, commands)
+            self.offset = max(offset, self.offset)
+
+
+class ProgressState:
+    """Accumulates progress events into the overall progress, throughput and ETA."""
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.total_bytes = 0
+        self.done_bytes = 0
+        self.sections = 0
+        self.done_sections = 0
+        self.commands = 0
+        self.section = ""
+        self.finished = False
+        self.error: None | str = None
+        self.start_time = time.perf_counter()
+
+    def update(self, event: ProgressEvent):
+        if event["kind"] == START:
+            self.reset()
+            self.total_bytes = event["bytes"]
+            self.sections = event["count"]
+        elif event["kind"] == ADVANCE:
+            self.done_bytes += event["bytes"]
+            self.commands += event["count"]
+            self.section = event["section"]
+        elif event["kind"] == SECTION:
+            self.done_sections += 1
+        elif event["kind"] == FINISH:
+            self.finished = True
+            self.error = event["error"]
+
+    def fraction(self) -> float:
+        if self.total_bytes == 0:
+            return 1.0 if self.finished else 0.0
+        return min(self.done_bytes / self.total_bytes, 1.0)
+
+    def throughput(self) -> float:
+        """Processed bytes of the section files per second."""
+        elapsed = time.perf_counter() - self.start_time
+        return self.done_bytes / 2 / elapsed if elapsed > 0 else 0.0
+
+    def eta(self) -> None | float:
+        """Estimated seconds until all sections are converted."""
+        throughput = self.throughput()
+        if throughput == 0:
+            return None
+        return (self.total_bytes - self.done_bytes) / 2 / throughput
+
+    def format(self) -> str:
+        text = (
+            f"{self.fraction() * 100:3.0f}%, section {self.done_sections} of {self.sections}, "
+            f"{self.commands} commands, {self.throughput() / 1024 / 1024:.1f} MB/s"
+        )
+        eta = self.eta()
+        if eta is not None and not self.finished:
+            text += f", ETA {eta:.0f} s"
+        return text
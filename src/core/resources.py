@@ -0,0 +1,68 @@
+from collections.abc import Callable, Iterable, Mapping
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+from typing import Any
+
+from core.source import read_text
+from core.templates import CompiledTemplate, load_template
+
+# Number of threads reading resources, the reads are small and mostly wait for the disk
+DEFAULT_IO_THREADS = 8
+
+
+def _read_resource(file_path: Path) -> None | str:
+    try:
+        return read_text(file_path)
+    except FileNotFoundError:
+        return None
+
+
+class ResourceLoader:
+    """
+    Reads the small resource files and templates in a thread pool, so the reads are issued
+    concurrently and overlap with the conversion of the section files.
+    Every prefetched file is handed out once, later reads go to the file again.
+    """
+
+    def __init__(self, max_workers: int = DEFAULT_IO_THREADS):
+        self._executor = ThreadPoolExecutor(max_workers, thread_name_prefix="resources")
+        self._texts: dict[Path, Future[None | str]] = {}
+        self._templates: dict[Path, Future[None | CompiledTemplate]] = {}
+
+    def submit(self, func: Callable[..., Any], *args: Any) -> Future:
+        return self._executor.submit(func, *args)
+
+    def prefetch(self, file_paths: Iterable[Path]):
+        for file_path in file_paths:
+            if file_path not in self._texts:
+                self._texts[file_path] = self._executor.submit(_read_resource, file_path)
+
+    def provide(self, texts: Mapping[Path, None | str]):
+        """Hand out the given texts instead of reading the files, None marks a missing file."""
+        for file_path, text in texts.items():
+            future: Future[None | str] = Future()
+            future.set_result(text)
+            self._texts[file_path] = future
+
+    def prefetch_templates(self, file_paths: Iterable[Path]):
+        for file_path in file_paths:
+            if file_path not in self._templates:
+                self._templates[file_path] = self._executor.submit(load_template, file_path)
+
+    def read(self, file_path: Path) -> None | str:
+        """Return the content of the file or None if it does not exist."""
+        future = self._texts.pop(file_path, None)
+        if future is None:
+            return _read_resource(file_path)
+        return future.result()
+
+    def template(self, file_path: Path) -> None | CompiledTemplate:
+        future = self._templates.pop(file_path, None)
+        if future is None:
+            return load_template(file_path)
+        return future.result()
+
+    def clear(self):
+        """Forget all prefetched files that were not read, e.g. after a failed run."""
+        self._texts.clear()
+        self._templates.clear()
@@ -0,0 +1,94 @@
+import mmap
+from pathlib import Path
+
+# Size of the chunks a file of unknown size is read in
+READ_CHUNK_SIZE = 1024 * 1024
+
+
+class SourceBuffer:
+    """
+    The raw bytes of a resource file. Regular files are memory mapped, so lines are found by
+    their offsets and only the slices that are actually needed are decoded.
+    All offsets are byte offsets, a line spans from its start to the offset after its newline.
+    Lines end at a newline, Windows line endings are translated when decoding.
+    """
+
+    __slots__ = ("path", "data", "_mmap")
+
+    def __init__(self, path: Path, data: bytes | mmap.mmap, mapped: None | mmap.mmap = None):
+        self.path = path
+        self.data = data
+        self._mmap = mapped
+
+    def __enter__(self) -> "SourceBuffer":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def __len__(self) -> int:
+        return len(self.data)
+
+    def __getstate__(self):
+        # A mapping can not be pickled, so the content is copied
+        return None, {"path": self.path, "data": bytes(self.data), "_mmap": None}
+
+    def close(self):
+        if self._mmap is not None:
+            self._mmap.close()
+            self._mmap = None
+            self.data = b""
+
+    def detach(self):
+        """Copy the content into memory, so it stays available after the file changed."""
+        if self._mmap is not None:
+            data = bytes(self._mmap)
+            self._mmap.close()
+            self._mmap = None
+            self.data = data
+
+    def line_end(self, start: int) -> int:
+        end = self.data.find(b"\n", start)
+        return len(self.data) if end < 0 else end + 1
+
+    def decode(self, start: int = 0, end: None | int = None) -> str:
+        text = self.data[start:end].decode("utf-8")
+        # Match the newline translation of files opened in text mode
+        return text.replace("\r\n", "\n") if "\r" in text else text
+
+    def line(self, start: int) -> str:
+        return self.decode(start, self.line_end(start))
+
+    def lines(self, start: int = 0, end: None | int = None) -> list[str]:
+        return split_lines(self.decode(start, end))
+
+
+def split_lines(text: str) -> list[str]:
+    """Split the text like readlines, every line but the last ends with its newline."""
+    lines = text.split("\n")
+    last = lines.pop()
+    result = [f"{line}\n" for line in lines]
+    if last:
+        result.append(last)
+    return result
+
+
+def open_source(path: Path) -> SourceBuffer:
+    """
+    Memory map the given file. Empty files and files whose size is not known up front,
+    like pipes, are read in chunks instead.
+    """
+    with open(path, "rb") as f:
+        try:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (ValueError, OSError):
+            chunks = []
+            while chunk := f.read(READ_CHUNK_SIZE):
+                chunks.append(chunk)
+            return SourceBuffer(path, b"".join(chunks))
+    return SourceBuffer(path, mapped, mapped)
+
+
+def read_text(path: Path) -> str:
+    with open_source(path) as source:
+        return source.decode()
@@ -0,0 +1,185 @@
+import re
+import sqlite3
+from collections.abc import Iterable
+from pathlib import Path
+from typing import TypedDict
+
+from core.ir import CommandIR, command_ir, signature
+from core.source import SourceBuffer
+from core.tex_parser import ParsedObject
+
+SYMBOL_INDEX_NAME = ".tex2dtx_symbols.db"
+# Increase whenever the schema changes, older indexes are rebuilt
+SYMBOL_INDEX_VERSION = 1
+
+# References to the labels set for every macro, e.g. \ref{macro:name} or \ref{macro:name_impl}
+REF_PATTERN = re.compile(rb"\\(?:ref|pageref|autoref|nameref)\{macro:([^}\n]+)\}")
+IMPL_SUFFIX = "_impl"
+
+
+class MacroSymbol(TypedDict):
+    name: str
+    line: int
+    signature: str
+    oarg_default: None | str
+    private: bool
+
+
+class RefSymbol(TypedDict):
+    label: str
+    line: int
+
+
+class SectionSymbols(TypedDict):
+    section: str
+    file: str
+    macros: list[MacroSymbol]
+    refs: list[RefSymbol]
+
+
+def macro_symbol(command: CommandIR) -> MacroSymbol:
+    return {
+        "name": command["name"],
+        "line": command["line"],
+        "signature": signature(command),
+        "oarg_default": command["oarg_default"],
+        "private": command["private"],
+    }
+
+
+def collect_macros(parsed: Iterable[ParsedObject]) -> list[MacroSymbol]:
+    return [
+        macro_symbol(command_ir(obj.o_command))
+        for obj in parsed
+        if obj.o_type == "command" and obj.o_command is not None
+    ]
+
+
+def collect_refs(source: SourceBuffer) -> list[RefSymbol]:
+    """Find all references to macro labels in the given file."""
+    refs: list[RefSymbol] = []
+    data = source.data
+    line_no = 1
+    last = 0
+    for match in REF_PATTERN.finditer(data):
+        line_no += data[last : match.start()].count(b"\n")
+        last = match.start()
+        refs.append({"label": match.group(1).decode("utf-8"), "line": line_no})
+    return refs
+
+
+class SymbolIndex:
+    """
+    Persistent index of all macros of a package and the references to their labels.
+    The index is stored as SQLite database in the target directory and is rebuilt after
+    every conversion, so it can be queried without parsing the sources again.
+    """
+
+    def __init__(self, db_path: Path):
+        self.db_path = db_path
+        self.connection = sqlite3.connect(db_path)
+        self.connection.row_factory = sqlite3.Row
+
+    def __enter__(self) -> "SymbolIndex":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        self.connection.close()
+
+    def is_current(self) -> bool:
+        """Whether the index was built with the current schema."""
+        version = self.connection.execute("PRAGMA user_version").fetchone()[0]
+        return version == SYMBOL_INDEX_VERSION
+
+    def rebuild(self, sections: Iterable[SectionSymbols]):
+        """Replace the whole index with the symbols of the given sections in one transaction."""
+        # The index is rebuilt by every conversion, so it does not have to survive a crash
+        self.connection.execute("PRAGMA synchronous = OFF")
+        with self.connection:
+            for table in ["macros", "refs"]:
+                self.connection.execute(f"DROP TABLE IF EXISTS {table}")
+            self.connection.execute(
+                "CREATE TABLE macros (name TEXT NOT NULL, section TEXT NOT NULL, "
+                "file TEXT NOT NULL, line INTEGER NOT NULL, signature TEXT NOT NULL, "
+                "oarg_default TEXT, private INTEGER NOT NULL)"
+            )
+            self.connection.execute(
+                "CREATE TABLE refs (label TEXT NOT NULL, section TEXT NOT NULL, "
+                "file TEXT NOT NULL, line INTEGER NOT NULL)"
+            )
+            for symbols in sections:
+                self._insert(symbols)
+            self.connection.execute("CREATE INDEX macros_name ON macros (name)")
+            self.connection.execute("CREATE INDEX refs_label ON refs (label)")
+            self.connection.execute(f"PRAGMA user_version = {SYMBOL_INDEX_VERSION}")
+
+    def replace_sections(self, sections: Iterable[SectionSymbols]):
+        """Replace the symbols of the given sections, the index has to be current."""
+        self.connection.execute("PRAGMA synchronous = OFF")
+        with self.connection:
+            for symbols in sections:
+                for table in ["macros", "refs"]:
+                    self.connection.execute(
+                        f"DELETE FROM {table} WHERE section = ?", (symbols["section"],)
+                    )
+                self._insert(symbols)
+
+    def _insert(self, symbols: SectionSymbols):
+        self.connection.executemany(
+            "INSERT INTO macros VALUES (?, ?, ?, ?, ?, ?, ?)",
+            [
+                (
+                    macro["name"],
+                    symbols["section"],
+                    symbols["file"],
+                    macro["line"],
+                    macro["signature"],
+                    macro["oarg_default"],
+                    macro["private"],
+                )
+                for macro in symbols["macros"]
+            ],
+        )
+        self.connection.executemany(
+            "INSERT INTO refs VALUES (?, ?, ?, ?)",
+            [
+                (ref["label"], symbols["section"], symbols["file"], ref["line"])
+                for ref in symbols["refs"]
+            ],
+        )
+
+    def lookup(self, name: str) -> list[sqlite3.Row]:
+        """All definitions of the macro with the given name, with or without backslash."""
+        return self.connection.execute(
+            "SELECT * FROM macros WHERE name = ? ORDER BY rowid", (name.lstrip("\\"),)
+        ).fetchall()
+
+    def duplicates(self) -> list[sqlite3.Row]:
+        """All definitions of macros that are defined more than once."""
+        return self.connection.execute(
+            "SELECT * FROM macros WHERE name IN "
+            "(SELECT name FROM macros GROUP BY name HAVING COUNT(*) > 1) "
+            "ORDER BY name, rowid"
+        ).fetchall()
+
+    def dangling(self) -> list[sqlite3.Row]:
+        """
+        All references to labels that are never set. Every macro sets the label of its
+        implementation, only public macros also set the label of their documentation.
+        """
+        return self.connection.execute(
+            "SELECT * FROM refs WHERE NOT EXISTS "
+            "(SELECT 1 FROM macros WHERE name = refs.label AND NOT private) "
+            "AND NOT (substr(label, -?) = ? AND EXISTS "
+            "(SELECT 1 FROM macros WHERE name = substr(refs.label, 1, length(refs.label) - ?))) "
+            "ORDER BY rowid",
+            (len(IMPL_SUFFIX), IMPL_SUFFIX, len(IMPL_SUFFIX)),
+        ).fetchall()
+
+    def counts(self) -> tuple[int, int]:
+        macros = self.connection.execute("SELECT COUNT(*) FROM macros").fetchone()[0]
+        refs = self.connection.execute("SELECT COUNT(*) FROM refs").fetchone()[0]
+        return macros, refs
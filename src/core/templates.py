@@ -0,0 +1,80 @@
+import re
+from collections.abc import Mapping
+from pathlib import Path
+
+# Text that looks like a placeholder, used to report placeholders without a value
+PLACEHOLDER_PATTERN = re.compile(r"<([A-Z][A-Z0-9_]*)>")
+
+
+class CompiledTemplate:
+    """
+    Template split into literal segments and the placeholder slots between them. A placeholder
+    is any key of the filled values in angle brackets, so the split is made once per set of
+    keys.
+    """
+
+    def __init__(self, text: str):
+        self.text = text
+        # Literals and slots by the keys they were split for
+        self._splits: dict[frozenset[str], tuple[list[str], list[str]]] = {}
+
+    def render(self, values: Mapping[str, object]) -> tuple[str, list[str]]:
+        """
+        Fill all slots in one pass. Returns the result and the placeholders without value,
+        which are kept unchanged in the result.
+        """
+        literals, slots = self._split(frozenset(values))
+        parts = [literals[0]]
+        for slot, literal in zip(slots, literals[1:]):
+            parts.append(f"{values[slot]}")
+            parts.append(literal)
+        missing = [
+            match.group(1)
+            for literal in literals
+            for match in PLACEHOLDER_PATTERN.finditer(literal)
+            if match.group(1) not in values
+        ]
+        return "".join(parts), missing
+
+    def _split(self, keys: frozenset[str]) -> tuple[list[str], list[str]]:
+        split = self._splits.get(keys)
+        if split is not None:
+            return split
+
+        literals: list[str] = []
+        slots: list[str] = []
+        if keys:
+            pattern = re.compile("<(" + "|".join(map(re.escape, sorted(keys))) + ")>")
+            pos = 0
+            for match in pattern.finditer(self.text):
+                literals.append(self.text[pos : match.start()])
+                slots.append(match.group(1))
+                pos = match.end()
+            literals.append(self.text[pos:])
+        else:
+            literals.append(self.text)
+        split = (literals, slots)
+        self._splits[keys] = split
+        return split
+
+
+# Compiled templates of this process by path, together with the mtime and size they were read at
+_template_cache: dict[Path, tuple[tuple[int, int], CompiledTemplate]] = {}
+
+
+def load_template(file_path: Path) -> None | CompiledTemplate:
+    """Return the compiled template, only reading the file again if it was modified."""
+    try:
+        stat = file_path.stat()
+    except FileNotFoundError:
+        _template_cache.pop(file_path, None)
+        return None
+
+    version = (stat.st_mtime_ns, stat.st_size)
+    cached = _template_cache.get(file_path)
+    if cached is not None and cached[0] == version:
+        return cached[1]
+
+    template = CompiledTemplate(file_path.read_text(encoding="utf-8"))
+    _template_cache[file_path] = (version, template)
+    return template
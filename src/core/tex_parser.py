@@ -0,0 +1,368 @@
+import re
+import sys
+import time
+from array import array
+from collections.abc import Callable, Iterable, Iterator
+from pathlib import Path
+
+from core.cancel import CANCEL_STEP, CancelToken
+from core.diagnostics import UNPROCESSED_LINE, Diagnostics
+from core.progress import PROGRESS_STEP
+from core.source import SourceBuffer, open_source
+
+
+class ParsedCommand:
+    """
+    A command definition and its documentation. The documentation and implementation
+    lines are stored as offsets into the source buffer, the lists of lines and
+    arguments are only decoded when they are accessed.
+    """
+
+    __slots__ = (
+        "source",
+        "name",
+        "oarg_default",
+        "private",
+        "line",
+        "impl_start",
+        "impl_end",
+        "_doc_lines",
+        "_arg_lines",
+        "_args",
+    )
+
+    def __init__(self, source: SourceBuffer):
+        self.source = source
+        self.name = "unknown"
+        self.oarg_default: None | str = None
+        self.private = False
+        # Line number of the definition, starting at 1
+        self.line = 0
+        self.impl_start = 0
+        self.impl_end = 0
+        # Offset and field code of every documentation line, packed into one int
+        self._doc_lines: None | array[int] = None
+        self._arg_lines: None | array[int] = None
+        self._args: None | list[tuple[str, str]] = None
+
+    def add_doc_line(self, offset: int, code: int):
+        if self._doc_lines is None:
+            self._doc_lines = array("Q")
+        self._doc_lines.append(offset << FIELD_BITS | code)
+
+    def add_arg_line(self, offset: int):
+        if self._arg_lines is None:
+            self._arg_lines = array("Q")
+        self._arg_lines.append(offset)
+
+    def _field(self, code: int) -> list[str]:
+        if self._doc_lines is None:
+            return []
+        line = self.source.line
+        return [
+            line(value >> FIELD_BITS) for value in self._doc_lines if value & FIELD_MASK == code
+        ]
+
+    def fields(self) -> list[list[str]]:
+        """The lines of all documentation fields in one pass, indexed by their field code."""
+        fields: list[list[str]] = [[] for _ in range(ERROR_FIELD + 1)]
+        if self._doc_lines is not None:
+            line = self.source.line
+            for value in self._doc_lines:
+                fields[value & FIELD_MASK].append(line(value >> FIELD_BITS))
+        return fields
+
+    def _all_args(self) -> list[tuple[str, str]]:
+        if self._args is None:
+            self._args = []
+            if self._arg_lines is not None:
+                for offset in self._arg_lines:
+                    match = ARG_PATTERN.search(self.source.line(offset))
+                    if match:
+                        self._args.append((match.group(1), match.group(2)))
+        return self._args
+
+    @property
+    def oarg(self) -> tuple[str, str]:
+        # The first argument is the optional one if there is a default value
+        args = self._all_args()
+        if self.oarg_default and len(args) > 0:
+            return args[0]
+        return ("", "")
+
+    @property
+    def args(self) -> list[tuple[str, str]]:
+        args = self._all_args()
+        if self.oarg_default and len(args) > 0:
+            return args[1:]
+        return args
+
+    @property
+    def desc(self) -> list[str]:
+        return self._field(DESC_FIELD)
+
+    @property
+    def todos(self) -> list[str]:
+        return self._field(TODO_FIELD)
+
+    @property
+    def errors(self) -> list[str]:
+        return self._field(ERROR_FIELD)
+
+    @property
+    def equation(self) -> list[str]:
+        return self._field(EQUATION_FIELD)
+
+    @property
+    def example(self) -> list[str]:
+        return self._field(EXAMPLE_FIELD)
+
+    @property
+    def implementation(self) -> list[str]:
+        return self.source.lines(self.impl_start, self.impl_end)
+
+    def __getstate__(self):
+        # The arguments are parsed again from the source after unpickling
+        return None, {slot: getattr(self, slot) for slot in self.__slots__ if slot != "_args"}
+
+    def __setstate__(self, state):
+        for slot, value in state[1].items():
+            setattr(self, slot, value)
+        self._args = None
+
+
+class ParsedObject:
+    """A span of lines of a section file, command objects also carry the parsed command."""
+
+    __slots__ = ("o_type", "source", "start", "end", "o_command")
+
+    def __init__(
+        self,
+        o_type: None | str,
+        source: SourceBuffer,
+        start: int,
+        end: int,
+        o_command: None | ParsedCommand = None,
+    ):
+        self.o_type = o_type
+        self.source = source
+        self.start = start
+        self.end = end
+        self.o_command = o_command
+
+    @property
+    def o_content(self) -> list[str]:
+        return self.source.lines(self.start, self.end)
+
+    @property
+    def o_category(self) -> Path:
+        return self.source.path
+
+
+# Token kinds a line can be classified as
+DEFINITION = "definition"
+CLOSE = "close"
+HEADER = "header"
+PRIVATE = "private"
+ARG = "arg"
+TODO = "todo"
+EQUATION = "equation"
+EXAMPLE = "example"
+ERROR = "error"
+COMMENT = "comment"
+BLANK = "blank"
+BODY = "body"
+
+# All kinds of lines starting with "% "
+COMMENT_KINDS = frozenset((PRIVATE, ARG, TODO, EQUATION, EXAMPLE, ERROR, COMMENT))
+
+# Codes of the fields of a command the documentation lines are collected in
+DESC_FIELD = 0
+TODO_FIELD = 1
+EQUATION_FIELD = 2
+EXAMPLE_FIELD = 3
+ERROR_FIELD = 4
+FIELD_BITS = 3
+FIELD_MASK = (1 << FIELD_BITS) - 1
+# Field the documentation lines of the given kind are collected in
+DOC_FIELDS = {
+    TODO: TODO_FIELD,
+    EQUATION: EQUATION_FIELD,
+    EXAMPLE: EXAMPLE_FIELD,
+    ERROR: ERROR_FIELD,
+    COMMENT: DESC_FIELD,
+}
+
+# Classifies a line by its start, the name of the matching group is the kind of the line.
+# Lines that do not match are body lines.
+LINE_PATTERN = re.compile(
+    r"(?P<definition>\\newcommand)"
+    r"|(?P<close>\})"
+    r"|(?P<header>%%)"
+    r"|(?P<private>% Private)"
+    r"|(?P<arg>% #)"
+    r"|(?P<todo>% TODO)"
+    r"|(?P<equation>% Equation)"
+    r"|(?P<example>% Example)"
+    r"|(?P<error>% Error)"
+    r"|(?P<comment>% )"
+    r"|(?P<blank>\s*\Z)"
+)
+# The same classification on the raw bytes of a line
+LINE_BYTES_PATTERN = re.compile(LINE_PATTERN.pattern.encode("ascii"))
+# Inside a definition only its end and further definitions have to be found
+COMMAND_LINE_PATTERN = re.compile(rb"^(?:\}|\\newcommand)", re.MULTILINE)
+
+NAME_PATTERN = re.compile(r"\\newcommand\\(\w+)")
+OARG_PATTERN = re.compile(r"\[\d+\](?:\[([^\]]+)\])?")
+ARG_PATTERN = re.compile(r"#\d+\s+([^,]+),\s*(.+)$")
+
+
+def classify_line(line: str) -> str:
+    match = LINE_PATTERN.match(line)
+    if match is None or match.lastgroup is None:
+        return BODY
+    return match.lastgroup
+
+
+def parse_lines(lines: Iterable[str], file_dir: Path) -> list[ParsedObject]:
+    """Parse the given lines of a section file, see parse_source."""
+    return parse_source(SourceBuffer(file_dir, "".join(lines).encode("utf-8")))
+
+
+def parse_source(
+    source: SourceBuffer,
+    on_progress: None | Callable[[int], None] = None,
+    cancel: None | CancelToken = None,
+    diagnostics: None | Diagnostics = None,
+) -> list[ParsedObject]:
+    """Split a section file into a list of objects, see iter_source."""
+    return list(iter_source(source, on_progress, cancel, diagnostics))
+
+
+def iter_source(
+    source: SourceBuffer,
+    on_progress: None | Callable[[int], None] = None,
+    cancel: None | CancelToken = None,
+    diagnostics: None | Diagnostics = None,
+) -> Iterator[ParsedObject]:
+    """
+    Split a section file into objects, classifying every line exactly once on its raw bytes.
+    The objects are yielded as soon as they are complete, so they can be rendered and released
+    one at a time. The command of each command object is built while its lines are read,
+    only the lines that define a command or are printed are decoded.
+    After every PROGRESS_STEP commands on_progress is called with the offset reached and
+    the cancel token is checked, the token is also checked after every CANCEL_STEP lines.
+    Lines that belong to no object are reported to diagnostics if given.
+    """
+    # Number of command objects yielded
+    count = 0
+
+    o_type: None | str = None
+    # Offset of the first line of the current object, -1 while the object has no content
+    start = -1
+    command = ParsedCommand(source)
+
+    data = source.data
+    size = len(data)
+    find = data.find
+    match_line = LINE_BYTES_PATTERN.match
+    search_command_line = COMMAND_LINE_PATTERN.search
+    pos = 0
+    # Number of the line starting at pos
+    line_no = 1
+    while pos < size:
+        if o_type == "command":
+            command_match = search_command_line(data, pos)
+            if command_match is None:
+                break
+            line_start = command_match.start()
+            line_no += data[pos:line_start].count(b"\n") + 1
+            pos = find(b"\n", line_start) + 1 or size
+            if command_match.group() == b"}":
+                command.impl_end = pos
+                yield ParsedObject(o_type, source, start, pos, command)
+                count += 1
+                if count % PROGRESS_STEP == 0:
+                    if on_progress is not None:
+                        on_progress(pos)
+                    if cancel is not None:
+                        cancel.check()
+                o_type = None
+                start = -1
+                command = ParsedCommand(source)
+            else:
+                _read_definition(command, source.decode(line_start, pos))
+            continue
+
+        line_start = pos
+        pos = find(b"\n", line_start) + 1 or size
+        line_no += 1
+        if cancel is not None and line_no % CANCEL_STEP == 0:
+            cancel.check()
+        line_match = match_line(data, line_start, pos)
+        if line_match is not None:
+            kind = line_match.lastgroup or BODY
+        else:
+            # Lines of unicode whitespace are only blank for the pattern on text
+            kind = classify_line(source.decode(line_start, pos))
+
+        if kind == DEFINITION:
+            o_type = "command"
+            _read_definition(command, source.decode(line_start, pos))
+            command.line = line_no - 1
+            command.impl_start = line_start
+            if start < 0:
+                start = line_start
+        elif kind == CLOSE:
+            yield ParsedObject(o_type, source, line_start if start < 0 else start, pos)
+            o_type = None
+            start = -1
+            command = ParsedCommand(source)
+        # If the line starts with % then it must be comment
+        elif kind in COMMENT_KINDS and o_type != "header":
+            o_type = "comment"
+            if start < 0:
+                start = line_start
+            # Lines in front of the definition document the command
+            field = DOC_FIELDS.get(kind)
+            if field is not None:
+                command.add_doc_line(line_start, field)
+            elif kind == ARG:
+                command.add_arg_line(line_start)
+            else:
+                command.private = True
+        elif kind == HEADER:
+            o_type = None if o_type == "header" else "header"
+        # If the line is empty and the current object type is comment - reset
+        elif kind == BLANK and o_type == "comment":
+            o_type = None
+            start = -1
+            command = ParsedCommand(source)
+        elif o_type is None and kind != BLANK and diagnostics is not None:
+            diagnostics.report(
+                UNPROCESSED_LINE,
+                f"Unprocessed line: {source.decode(line_start, pos).strip()}.",
+                line_no - 1,
+            )
+
+
+def _read_definition(command: ParsedCommand, line: str):
+    match = NAME_PATTERN.search(line)
+    if match:
+        command.name = match.group(1)
+    match = OARG_PATTERN.search(line)
+    if match:
+        command.oarg_default = match.group(1)
+
+
+if __name__ == "__main__":
+    # Measure the parser throughput: python -m core.tex_parser FILE...
+    sources = [open_source(Path(arg)) for arg in sys.argv[1:]]
+    line_count = sum(len(source.lines()) for source in sources)
+
+    start = time.perf_counter()
+    for source in sources:
+        parse_source(source)
+    duration = time.perf_counter() - start
+    print(f"Parsed {line_count} lines in {duration:.3f} s ({line_count / duration:.0f} lines/s).")
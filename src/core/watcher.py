@@ -0,0 +1,95 @@
+import os
+import time
+from pathlib import Path
+
+from core.discovery import FileStat, discover
+
+# Seconds between two scans of the watched directories
+DEFAULT_POLL_INTERVAL = 0.25
+# Seconds without further changes before a burst of changes counts as finished
+DEFAULT_DEBOUNCE = 0.3
+
+Snapshot = dict[str, FileStat]
+
+
+class DirectoryWatcher:
+    """
+    Detect changes of the files a conversion reads by polling their size and modification time.
+    The section files are found like the converter finds them, so files it skips (e.g. drafts
+    excluded by a pattern) do not trigger a conversion. The given extra dirs and files (e.g.
+    templates and header resources) are watched completely.
+    """
+
+    def __init__(
+        self,
+        rsc_dir: Path,
+        include: None | list[str] = None,
+        exclude: None | list[str] = None,
+        ignore: None | list[Path] = None,
+        dirs: None | list[Path] = None,
+        files: None | list[Path] = None,
+        poll_interval: float = DEFAULT_POLL_INTERVAL,
+        debounce: float = DEFAULT_DEBOUNCE,
+    ):
+        self.rsc_dir = rsc_dir
+        self.include = include
+        self.exclude = exclude
+        self.ignore = ignore or []
+        self.dirs = dirs or []
+        self.files = files or []
+        self.poll_interval = poll_interval
+        self.debounce = debounce
+
+        self._snapshot = self.snapshot()
+
+    def snapshot(self) -> Snapshot:
+        sources = discover(self.rsc_dir, self.include, self.exclude, self.ignore)
+        result: Snapshot = {
+            str(file_dir): sources["stats"][name] for name, file_dir in sources["sections"].items()
+        }
+        for directory in self.dirs:
+            self._scan(str(directory), result)
+        for file_dir in self.files:
+            try:
+                stat = os.stat(file_dir)
+                result[str(file_dir)] = (stat.st_mtime_ns, stat.st_size)
+            except FileNotFoundError:
+                pass
+        return result
+
+    def wait_for_change(self) -> set[str]:
+        """Block until files changed and no further change happened for the debounce time."""
+        while True:
+            time.sleep(self.poll_interval)
+            current = self.snapshot()
+            if current != self._snapshot:
+                break
+
+        # Wait until a burst of saves is over
+        last_change = time.monotonic()
+        while time.monotonic() - last_change < self.debounce:
+            time.sleep(self.poll_interval)
+            latest = self.snapshot()
+            if latest != current:
+                current = latest
+                last_change = time.monotonic()
+
+        changed = {
+            path
+            for path in current.keys() | self._snapshot.keys()
+            if current.get(path) != self._snapshot.get(path)
+        }
+        self._snapshot = current
+        return changed
+
+    def _scan(self, directory: str, result: Snapshot):
+        try:
+            with os.scandir(directory) as it:
+                for entry in it:
+                    if entry.is_dir(follow_symlinks=False):
+                        self._scan(entry.path, result)
+                    elif entry.is_file():
+                        stat = entry.stat()
+                        result[entry.path] = (stat.st_mtime_ns, stat.st_size)
+        except FileNotFoundError:
+            pass
@@ -0,0 +1,268 @@
+import hashlib
+import os
+import shutil
+import tempfile
+import uuid
+from collections.abc import Iterator
+from pathlib import Path
+from typing import IO
+
+# Size of the buffers used for the output file and the implementation spool
+DEFAULT_BUFFER_SIZE = 1024 * 1024
+# Hash used to decide whether the new output differs from the existing file
+HASH_ALGORITHM = "sha256"
+
+# A rendered chunk of the dtx, either text or texts and spooled files that are written in order
+Chunk = str | list[str | IO[str]]
+
+
+def iter_chunk(chunk: Chunk) -> Iterator[str]:
+    """The texts of the chunk, spooled files are read in blocks and closed."""
+    if isinstance(chunk, str):
+        yield chunk
+        return
+    for part in chunk:
+        if isinstance(part, str):
+            yield part
+            continue
+        part.seek(0)
+        while block := part.read(DEFAULT_BUFFER_SIZE):
+            yield block
+        part.close()
+
+
+def chunk_text(chunk: Chunk) -> str:
+    return chunk if isinstance(chunk, str) else "".join(iter_chunk(chunk))
+
+
+def file_digest(file_path: Path) -> bytes:
+    with open(file_path, "rb") as f:
+        return hashlib.file_digest(f, HASH_ALGORITHM).digest()
+
+
+def _fsync_dir(dir_path: Path):
+    """Persist the rename of a file, directories can not be opened on Windows."""
+    if os.name != "posix":
+        return
+    fd = os.open(dir_path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def encode_text(text: str) -> bytes:
+    """The bytes of the text as they are written by a file opened in text mode."""
+    return (text if os.linesep == "\n" else text.replace("\n", os.linesep)).encode("utf-8")
+
+
+class MemoryWriter:
+    """Collects the chunks of a dtx file in memory, see DtxWriter."""
+
+    def __init__(self):
+        self.docu: list[str] = []
+        self.impl: list[str] = []
+
+    def write_docu(self, chunk: Chunk, section: None | str = None):
+        self.docu.extend(iter_chunk(chunk))
+
+    def write_impl(self, chunk: Chunk, section: None | str = None):
+        self.impl.extend(iter_chunk(chunk))
+
+    def chunks(self) -> Iterator[str]:
+        """All chunks in the order of the dtx file."""
+        yield from self.docu
+        yield from self.impl
+
+
+def write_if_changed(file_path: Path, text: str, fsync: bool = False) -> bool:
+    """
+    Atomically replace the file with the given text, unless it already has this content.
+    Returns whether the file was rewritten.
+    """
+    data = encode_text(text)
+    try:
+        if file_path.stat().st_size == len(data):
+            if file_digest(file_path) == hashlib.new(HASH_ALGORITHM, data).digest():
+                return False
+    except FileNotFoundError:
+        pass
+
+    temp_path = file_path.with_name(f".{file_path.name}.{uuid.uuid4().hex[:8]}.tmp")
+    try:
+        with open(temp_path, "xb") as f:
+            f.write(data)
+            if fsync:
+                f.flush()
+                os.fsync(f.fileno())
+        os.replace(temp_path, file_path)
+    except BaseException:
+        temp_path.unlink(missing_ok=True)
+        raise
+    if fsync:
+        _fsync_dir(file_path.parent)
+    return True
+
+
+def splice_file(
+    file_path: Path,
+    replacements: list[tuple[int, int, bytes]],
+    buffer_size: int = DEFAULT_BUFFER_SIZE,
+    fsync: bool = False,
+):
+    """
+    Atomically replace the byte ranges [start, end) of the file with the given data.
+    The ranges must be sorted and must not overlap, all other bytes are copied unchanged.
+    """
+    temp_path = file_path.with_name(f".{file_path.name}.{uuid.uuid4().hex[:8]}.tmp")
+    try:
+        with open(file_path, "rb") as src, open(temp_path, "xb") as dst:
+            pos = 0
+            for start, end, data in replacements:
+                _copy_range(src, dst, start - pos, buffer_size)
+                dst.write(data)
+                src.seek(end)
+                pos = end
+            shutil.copyfileobj(src, dst, buffer_size)
+            if fsync:
+                dst.flush()
+                os.fsync(dst.fileno())
+        os.replace(temp_path, file_path)
+    except BaseException:
+        temp_path.unlink(missing_ok=True)
+        raise
+    if fsync:
+        _fsync_dir(file_path.parent)
+
+
+def _copy_range(src: IO[bytes], dst: IO[bytes], size: int, buffer_size: int):
+    while size > 0:
+        block = src.read(min(size, buffer_size))
+        if not block:
+            raise EOFError(f"{src.name} ended {size} bytes early.")
+        dst.write(block)
+        size -= len(block)
+
+
+class DtxWriter:
+    """
+    Buffered sink for the chunks of a dtx file.
+
+    The header and the documentation part are written directly to a temporary file next to
+    the output file, while the implementation part is spooled to a second temporary file and
+    appended on close. This way the document never has to be held in memory as a whole.
+    The finished file atomically replaces the output file, unless the content did not change,
+    then the existing file and its modification time are kept.
+    """
+
+    def __init__(
+        self, file_path: Path, buffer_size: int = DEFAULT_BUFFER_SIZE, fsync: bool = False
+    ):
+        self.file_path = file_path
+        self.buffer_size = buffer_size
+        # Flush the file to the disk before it replaces the output file
+        self.fsync = fsync
+        self.closed = False
+        # Whether the output file was replaced, set on close
+        self.rewritten = False
+        # Byte ranges of the chunks written for a section, the implementation ranges are
+        # relative to the implementation part until it is appended on close
+        self.docu_ranges: dict[str, tuple[int, int]] = {}
+        self.impl_ranges: dict[str, tuple[int, int]] = {}
+
+        self.temp_path = file_path.with_name(f".{file_path.name}.{uuid.uuid4().hex[:8]}.tmp")
+        self._docu: IO[str] = open(self.temp_path, "x", encoding="utf-8", buffering=buffer_size)
+        self._impl: IO[str] = tempfile.TemporaryFile(
+            "w+", encoding="utf-8", buffering=buffer_size, dir=file_path.parent
+        )
+
+    def __enter__(self) -> "DtxWriter":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+    def write_docu(self, chunk: Chunk, section: None | str = None):
+        """Append a chunk to the header and documentation part, see write_impl."""
+        if section is None:
+            self._write(self._docu, chunk)
+        else:
+            self.docu_ranges[section] = self._write_range(self._docu, chunk)
+
+    def write_impl(self, chunk: Chunk, section: None | str = None):
+        """Append a chunk to the implementation part, the byte range of a section is kept."""
+        if section is None:
+            self._write(self._impl, chunk)
+        else:
+            self.impl_ranges[section] = self._write_range(self._impl, chunk)
+
+    def _write_range(self, file: IO[str], chunk: Chunk) -> tuple[int, int]:
+        # The position of a text file is its byte offset as long as it is not decoded
+        start = file.tell()
+        self._write(file, chunk)
+        return start, file.tell()
+
+    def _write(self, file: IO[str], chunk: Chunk):
+        if isinstance(chunk, str):
+            file.write(chunk)
+            return
+        for part in chunk:
+            if isinstance(part, str):
+                file.write(part)
+            else:
+                part.seek(0)
+                shutil.copyfileobj(part, file, self.buffer_size)
+                part.close()
+
+    def close(self):
+        """Join the implementation part to the documentation part and replace the output."""
+        if self.closed:
+            return
+        self.closed = True
+        try:
+            docu_size = self._docu.tell()
+            self.impl_ranges = {
+                section: (start + docu_size, end + docu_size)
+                for section, (start, end) in self.impl_ranges.items()
+            }
+            self._impl.seek(0)
+            shutil.copyfileobj(self._impl, self._docu, self.buffer_size)
+            self._impl.close()
+            self._docu.flush()
+            if self.fsync:
+                os.fsync(self._docu.fileno())
+            self._docu.close()
+
+            if self._unchanged():
+                self.temp_path.unlink()
+            else:
+                os.replace(self.temp_path, self.file_path)
+                self.rewritten = True
+                if self.fsync:
+                    _fsync_dir(self.file_path.parent)
+        except BaseException:
+            self._impl.close()
+            self._docu.close()
+            self.temp_path.unlink(missing_ok=True)
+            raise
+
+    def abort(self):
+        """Close all files and remove the partially written output, the old output is kept."""
+        if self.closed:
+            return
+        self.closed = True
+        self._impl.close()
+        self._docu.close()
+        self.temp_path.unlink(missing_ok=True)
+
+    def _unchanged(self) -> bool:
+        """Whether the output file exists with the same content as the new file."""
+        try:
+            if self.file_path.stat().st_size != self.temp_path.stat().st_size:
+                return False
+            return file_digest(self.file_path) == file_digest(self.temp_path)
+        except FileNotFoundError:
+            return False
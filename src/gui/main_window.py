@@ -1,34 +1,59 @@
+import os
 import threading
 from idlelib.tooltip import Hovertip
 from pathlib import Path
-from tkinter import HORIZONTAL, Button, Label, StringVar, Tk, filedialog, messagebox
+from tkinter import (
+    HORIZONTAL,
+    Button,
+    IntVar,
+    Label,
+    Spinbox,
+    StringVar,
+    TclError,
+    Tk,
+    filedialog,
+    messagebox,
+)
 from tkinter.ttk import Progressbar, Separator
 
 # own imports
 from core.converter import Converter
+from core.progress import ProgressState
 from gui.helper import center_window
-from gui.settings import PAD_X, PAD_Y
+from gui.preview_window import PreviewWindow
+from gui.settings import BTN_W, PAD_X, PAD_Y, PROGRESS_POLL_MS, SEPARATOR, WINDOW_W
 from gui.tooltips import TooltipDict
 from meta_information import MetaInformation
 
+# Resolution of the progress bar
+PROGRESS_MAXIMUM = 1000
+
 
 class GuiApp:
-    def __init__(self, rsc_dir: Path, tgt_dir: Path):
+    def __init__(self, rsc_dir: Path, tgt_dir: Path, jobs: int = 1):
         self.window = Tk()
         self.window.title("Tex to Dtx Converter")
 
         self.meta_info = MetaInformation()
+        self.meta_info.set_profiling(True)
+        self.meta_info.set_progress(True)
+        self.meta_info.set_limits()
+        self.progress_state = ProgressState()
 
         self.row_idx = 0
 
         self.init_resource_folder(rsc_dir, tgt_dir)
+        self.init_settings(jobs)
         separator = Separator(self.window, orient="horizontal")
         separator.grid(row=self.row(), column=0, columnspan=3, padx=PAD_X, pady=PAD_Y, sticky="EW")
         self.init_progressindicator()
 
         self.btn_run = Button(self.window, text="Convert", command=lambda: self.run())
-        self.btn_run.grid(row=self.row_idx, column=0, columnspan=3, padx=PAD_X, pady=10)
+        self.btn_run.grid(row=self.row_idx, column=0, columnspan=2, padx=PAD_X, pady=10)
         Hovertip(self.btn_run, TooltipDict["btn_run"])
+        self.btn_cancel = Button(self.window, text="Cancel", command=lambda: self.cancel())
+        self.btn_cancel.grid(row=self.row_idx, column=2, padx=PAD_X, pady=10)
+        Hovertip(self.btn_cancel, TooltipDict["btn_cancel"])
 
         center_window(self.window)
         self.window.mainloop()
@@ -48,33 +73,67 @@ class GuiApp:
             messagebox.showinfo(message="No folder selected.", title="Error")
             return
 
+        try:
+            self.meta_info.set_jobs(self.iv_jobs.get())
+        except TclError:
+            messagebox.showinfo(message="Number of jobs must be a number.", title="Error")
+            return
+
         self.meta_info.finished = False
         converter = Converter(self.meta_info)
 
         self.lbl_progstate.config(text="Conversion in progress.")
         self.new_thread = threading.Thread(target=converter.execute)
         self.new_thread.start()
-        self.window.after(50, lambda: self.listen_for_result())
+        # Tk must only be used from the main thread, so it polls the progress of the converter
+        self.window.after(PROGRESS_POLL_MS, self.listen_for_result)
+
+    def preview(self):
+        """Open a preview of the selected source directory, independent of the conversion."""
+        meta_info = MetaInformation()
+        meta_info.set_dirs(Path(self.sv_rsc_dir.get()), Path(self.sv_tgt_dir.get()))
+        PreviewWindow(self.window, meta_info)
+
+    def cancel(self):
+        """Ask the running conversion to stop at the next line, object or section."""
+        if self.meta_info.finished or self.meta_info.cancel is None:
+            return
+        self.meta_info.cancel.cancel()
+        self.lbl_progstate.config(text="Cancelling conversion.")
 
     def listen_for_result(self):
-        """Update the GUI on the number of files processed and how many are still left."""
-        # TODO what was this for
-        tmp = self.meta_info.finished
-
-        count_cur_file = self.meta_info.get_cur_file_count()
-        count_max_file = self.meta_info.get_max_file_count()
-
-        self.file_progress["value"] = count_cur_file
-        self.file_progress["maximum"] = count_max_file
-        self.file_progress.update()
-
-        self.lbl_mile_prog.config(text=f"Finished file {count_cur_file} of {count_max_file}.")
+        """
+        Update the GUI with all pending progress events of the conversion, polled while the
+        converter thread runs.
+        """
+        if self.meta_info.progress is None:
+            return
 
-        if not self.meta_info.finished and not tmp:
-            self.window.after(50, lambda: self.listen_for_result())
-        else:
-            self.lbl_progstate.config(text="Finished all files.")
+        events = self.meta_info.progress.drain()
+        for event in events:
+            self.progress_state.update(event)
+        state = self.progress_state
+
+        if len(events) > 0:
+            self.file_progress["value"] = state.fraction() * PROGRESS_MAXIMUM
+            self.file_progress["maximum"] = PROGRESS_MAXIMUM
+            self.file_progress.update()
+
+            self.lbl_mile_prog.config(text=state.format())
+
+        if state.finished:
+            if state.error is None:
+                self.lbl_progstate.config(text="Finished all files.")
+            elif self.meta_info.cancel is not None and self.meta_info.cancel.cancelled():
+                self.lbl_progstate.config(text=f"Conversion cancelled: {state.error}")
+            else:
+                self.lbl_progstate.config(text=f"Conversion failed: {state.error}")
+            self.lbl_stages.config(text=self.meta_info.profiler.stage_summary(SEPARATOR))
             self.meta_info.reset()
+        elif self.new_thread.is_alive():
+            # The finish event is reported before the thread ends, so it was drained above
+            # once the thread is gone
+            self.window.after(PROGRESS_POLL_MS, self.listen_for_result)
 
     ###############################################################################################
     # Initialization functions
@@ -126,6 +185,27 @@ class GuiApp:
         btn_tgt.grid(row=self.row(), column=2, padx=PAD_X, pady=PAD_Y, sticky="EW")
         Hovertip(btn_tgt, TooltipDict["btn_tgt"])
 
+    def init_settings(self, jobs: int):
+        """Add GUI elements for the conversion settings."""
+        self.iv_jobs = IntVar()
+        self.iv_jobs.set(jobs)
+
+        lbl_jobs = Label(self.window, text="Jobs:")
+        lbl_jobs.grid(row=self.row_idx, column=0, padx=PAD_X, pady=PAD_Y, sticky="EW")
+        sb_jobs = Spinbox(
+            self.window,
+            from_=1,
+            to=os.cpu_count() or 1,
+            textvariable=self.iv_jobs,
+            width=BTN_W,
+        )
+        sb_jobs.grid(row=self.row_idx, column=1, padx=PAD_X, pady=PAD_Y, sticky="W")
+        Hovertip(sb_jobs, TooltipDict["sb_jobs"])
+
+        btn_preview = Button(self.window, text="Preview", command=lambda: self.preview())
+        btn_preview.grid(row=self.row(), column=2, padx=PAD_X, pady=PAD_Y, sticky="EW")
+        Hovertip(btn_preview, TooltipDict["btn_preview"])
+
     def init_progressindicator(self):
         """Add GUI progressbar and corresponding label."""
         # Update to get the correct width for the progressbar
@@ -144,3 +224,7 @@ class GuiApp:
         # Progress label
         self.lbl_progstate = Label(self.window, text="Program is not yet running!")
         self.lbl_progstate.grid(row=self.row(), columnspan=3, sticky="E", padx=PAD_X, pady=PAD_Y)
+
+        # Time spent in the stages of the last conversion
+        self.lbl_stages = Label(self.window, text="", wraplength=WINDOW_W)
+        self.lbl_stages.grid(row=self.row(), columnspan=3, sticky="E", padx=PAD_X, pady=PAD_Y)
@@ -0,0 +1,224 @@
+import queue
+from collections.abc import Callable
+from concurrent.futures import Future, ThreadPoolExecutor
+from idlelib.tooltip import Hovertip
+from tkinter import (
+    BOTH,
+    DISABLED,
+    END,
+    HORIZONTAL,
+    LEFT,
+    NORMAL,
+    RIGHT,
+    Button,
+    Frame,
+    Label,
+    Text,
+    Tk,
+    Toplevel,
+    X,
+    Y,
+)
+from tkinter.ttk import Panedwindow, Scrollbar, Treeview
+
+# own imports
+from core.preview import PreviewRenderer, SectionOutline
+from gui.settings import (
+    MACRO_BATCH,
+    PAD_X,
+    PAD_Y,
+    PREVIEW_H,
+    PREVIEW_MAX_CHARS,
+    PREVIEW_POLL_MS,
+    PREVIEW_W,
+)
+from gui.tooltips import TooltipDict
+from meta_information import MetaInformation
+
+
+class PreviewWindow:
+    """
+    Lists the sections and macros of a package and shows the dtx fragment of the selected
+    one. The section files are only parsed for the list, fragments are rendered on demand
+    in the background and the macros of a section are only listed once it is expanded.
+    """
+
+    def __init__(self, master: Tk, meta_info: MetaInformation):
+        self.window = Toplevel(master)
+        self.window.title("Preview")
+        self.window.geometry(f"{PREVIEW_W}x{PREVIEW_H}")
+        self.window.protocol("WM_DELETE_WINDOW", self.close)
+
+        self.renderer = PreviewRenderer(meta_info)
+        # Renders one fragment at a time, pending ones are dropped when the selection changes
+        self.executor = ThreadPoolExecutor(1, thread_name_prefix="preview")
+        self.pending: None | Future = None
+        # Increased for every selection, results of older selections are not shown
+        self.selection = 0
+        # Handlers of finished background work with their arguments, Tk must only be used
+        # from the main thread, so they are called by its poll
+        self.done: queue.Queue[tuple[Callable[..., None], tuple]] = queue.Queue()
+
+        # Section and macro index of every tree item, None for the section itself
+        self.items: dict[str, tuple[str, None | int]] = {}
+        self.section_items: dict[str, str] = {}
+        # Outlines the listed macros of the expanded sections were taken from
+        self.listed: dict[str, SectionOutline] = {}
+
+        self.init_widgets()
+        self.poll_id = self.window.after(PREVIEW_POLL_MS, self.poll)
+        self.load()
+
+    def init_widgets(self):
+        """Add the tree of sections and macros next to the fragment view."""
+        toolbar = Frame(self.window)
+        toolbar.pack(fill=X, padx=PAD_X, pady=PAD_Y)
+        btn_reload = Button(toolbar, text="Reload", command=lambda: self.load())
+        btn_reload.pack(side=LEFT)
+        Hovertip(btn_reload, TooltipDict["btn_reload"])
+        self.lbl_status = Label(toolbar, text="")
+        self.lbl_status.pack(side=RIGHT)
+
+        panes = Panedwindow(self.window, orient=HORIZONTAL)
+        panes.pack(fill=BOTH, expand=True, padx=PAD_X, pady=PAD_Y)
+
+        tree_frame = Frame(panes)
+        self.tree = Treeview(tree_frame, columns=("line",), selectmode="browse")
+        self.tree.heading("#0", text="Macro")
+        self.tree.heading("line", text="Line")
+        self.tree.column("line", width=60, stretch=False, anchor="e")
+        tree_scroll = Scrollbar(tree_frame, command=self.tree.yview)
+        self.tree.configure(yscrollcommand=tree_scroll.set)
+        tree_scroll.pack(side=RIGHT, fill=Y)
+        self.tree.pack(side=LEFT, fill=BOTH, expand=True)
+        self.tree.bind("<<TreeviewOpen>>", lambda event: self.expand())
+        self.tree.bind("<<TreeviewSelect>>", lambda event: self.select())
+        panes.add(tree_frame, weight=1)
+
+        text_frame = Frame(panes)
+        self.text = Text(text_frame, wrap="none", state=DISABLED)
+        text_scroll = Scrollbar(text_frame, command=self.text.yview)
+        self.text.configure(yscrollcommand=text_scroll.set)
+        text_scroll.pack(side=RIGHT, fill=Y)
+        self.text.pack(side=LEFT, fill=BOTH, expand=True)
+        panes.add(text_frame, weight=3)
+
+    def load(self):
+        """Parse all section files in the background and list them."""
+        self.lbl_status.config(text="Reading the section files.")
+        future = self.executor.submit(self.renderer.load)
+        future.add_done_callback(lambda done: self.done.put((self.show_sections, (done,))))
+
+    def poll(self):
+        """Call the handlers of all background work that finished since the last poll."""
+        while True:
+            try:
+                handler, args = self.done.get_nowait()
+            except queue.Empty:
+                break
+            handler(*args)
+        self.poll_id = self.window.after(PREVIEW_POLL_MS, self.poll)
+
+    def show_sections(self, future: Future):
+        if future.exception() is not None:
+            self.lbl_status.config(text=f"Reading failed: {future.exception()}")
+            return
+
+        self.tree.delete(*self.tree.get_children())
+        self.items.clear()
+        self.section_items.clear()
+        self.listed.clear()
+        sections: list[SectionOutline] = future.result()
+        for section in sections:
+            iid = self.tree.insert("", END, text=section["name"], values=("",))
+            self.items[iid] = (section["name"], None)
+            self.section_items[section["name"]] = iid
+            # Placeholder that makes the section expandable until its macros are listed
+            if section["macros"]:
+                self.tree.insert(iid, END, text="...")
+        macro_count = sum(len(section["macros"]) for section in sections)
+        self.lbl_status.config(text=f"{len(sections)} sections, {macro_count} macros.")
+
+    def expand(self):
+        """List the macros of the opened section if they are not listed yet."""
+        iid = self.tree.focus()
+        if iid not in self.items:
+            return
+        section_name = self.items[iid][0]
+        if section_name not in self.listed:
+            self.list_macros(section_name)
+
+    def list_macros(self, section_name: str):
+        iid = self.section_items[section_name]
+        section = self.renderer.sections[section_name]
+        self.listed[section_name] = section
+        for child in self.tree.get_children(iid):
+            self.items.pop(child, None)
+        self.tree.delete(*self.tree.get_children(iid))
+        self.insert_macros(iid, section, 0)
+
+    def insert_macros(self, iid: str, section: SectionOutline, start: int):
+        """Insert the macros in batches, so a large section does not block the window."""
+        if self.listed.get(section["name"]) is not section:
+            # The section was listed again in the meantime
+            return
+        for index in range(start, min(start + MACRO_BATCH, len(section["macros"]))):
+            macro = section["macros"][index]
+            name = f"{macro['name']} (private)" if macro["private"] else macro["name"]
+            child = self.tree.insert(iid, END, text=name, values=(macro["line"],))
+            self.items[child] = (section["name"], index)
+        if start + MACRO_BATCH < len(section["macros"]):
+            self.window.after_idle(self.insert_macros, iid, section, start + MACRO_BATCH)
+
+    def select(self):
+        """Show the fragment of the selected section or macro, rendering it if needed."""
+        selection = self.tree.selection()
+        if len(selection) == 0 or selection[0] not in self.items:
+            return
+        section_name, macro = self.items[selection[0]]
+        self.selection += 1
+        if self.pending is not None:
+            self.pending.cancel()
+            self.pending = None
+
+        fragment = self.renderer.cached(section_name, macro)
+        if fragment is not None:
+            self.show_fragment(fragment)
+            return
+
+        self.lbl_status.config(text="Rendering.")
+        current = self.selection
+        self.pending = self.executor.submit(self.renderer.render, section_name, macro)
+        self.pending.add_done_callback(
+            lambda done: self.done.put((self.show_result, (current, section_name, done)))
+        )
+
+    def show_result(self, selection: int, section_name: str, future: Future):
+        if future.cancelled() or selection != self.selection:
+            return
+        # The section file changed, the listed macros may no longer match its outline
+        listed = self.listed.get(section_name)
+        if listed is not None and listed is not self.renderer.sections[section_name]:
+            self.list_macros(section_name)
+            self.lbl_status.config(text=f"Section {section_name} changed, listed it again.")
+            return
+        if future.exception() is not None:
+            self.lbl_status.config(text=f"Rendering failed: {future.exception()}")
+            return
+        self.show_fragment(future.result())
+
+    def show_fragment(self, fragment: str):
+        if len(fragment) > PREVIEW_MAX_CHARS:
+            fragment = fragment[:PREVIEW_MAX_CHARS] + "\n% ...\n"
+            self.lbl_status.config(text=f"Showing the first {PREVIEW_MAX_CHARS} characters.")
+        else:
+            self.lbl_status.config(text="")
+        self.text.config(state=NORMAL)
+        self.text.delete("1.0", END)
+        self.text.insert("1.0", fragment)
+        self.text.config(state=DISABLED)
+
+    def close(self):
+        self.window.after_cancel(self.poll_id)
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        self.window.destroy()
@@ -14,3 +14,16 @@ EBOX_ADD_W = 50
 
 F_COMBLIST_H = 100
 F_COMBLIST_W = WINDOW_W * 0.9 - 2 * PAD_X
+
+# Milliseconds between two updates of the progress of a running conversion
+PROGRESS_POLL_MS = 50
+
+# Preview window dimensions
+PREVIEW_W = 1100
+PREVIEW_H = 700
+# Longest fragment shown in the preview, the rest of a large section is cut off
+PREVIEW_MAX_CHARS = 500_000
+# Number of macros listed at once when a section is expanded
+MACRO_BATCH = 500
+# Milliseconds between two checks for fragments rendered in the background
+PREVIEW_POLL_MS = 50
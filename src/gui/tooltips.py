@@ -1,5 +1,9 @@
 TooltipDict = {
     "btn_run": "Convert .tex files in source folder to .dtx files and save to target folder.",
+    "btn_cancel": "Stop the running conversion, no partially written .dtx file is kept.",
     "btn_src": "Choose in which source folder to search for the .tex files.",
     "btn_tgt": "Choose to which target folder the .dtx file should be saved.",
+    "sb_jobs": "Number of worker processes used to convert the section files in parallel.",
+    "btn_preview": "Browse the sections and macros of the source folder and preview their .dtx.",
+    "btn_reload": "Read the section files again.",
 }
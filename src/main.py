@@ -1,7 +1,12 @@
 import argparse
+import multiprocessing
 import os
 import sys
 from pathlib import Path
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from meta_information import MetaInformation
 
 # https://stackoverflow.com/questions/404744/
 if getattr(sys, "frozen", False):
@@ -12,6 +17,25 @@ else:
     APP_PATH = Path(os.path.dirname(os.path.abspath(__file__)))
 
 
+def configure(args: argparse.Namespace) -> "MetaInformation":
+    """Meta information with the conversion settings given on the command line."""
+    from meta_information import MetaInformation
+
+    meta_info = MetaInformation()
+    meta_info.set_dirs(args.resource_dir, args.target_dir)
+    meta_info.set_jobs(args.jobs)
+    meta_info.set_discovery(args.include, args.exclude)
+    cache_size = args.cache_size * 1024 * 1024 if args.cache_size is not None else None
+    meta_info.set_cache(not args.no_cache, args.clear_cache, cache_size)
+    buffer_size = args.buffer_size * 1024 if args.buffer_size is not None else None
+    backends = [name for name in ["json", "markdown"] if getattr(args, name)]
+    meta_info.set_output(buffer_size, args.fsync, args.shards, backends)
+    meta_info.set_max_warnings(args.max_warnings)
+    if args.timeout is not None or args.max_commands is not None:
+        meta_info.set_limits(args.timeout, args.max_commands)
+    return meta_info
+
+
 def main():
     parser = argparse.ArgumentParser(description="Example program with CLI and GUI modes")
 
@@ -32,18 +56,311 @@ def main():
         help="Target directory path",
     )
 
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        default=1,
+        help="Number of worker processes used to convert the section files",
+    )
+
+    parser.add_argument(
+        "--include",
+        action="append",
+        default=None,
+        metavar="GLOB",
+        help="Glob pattern of the section files, replaces *.tex, can be given multiple times",
+    )
+
+    parser.add_argument(
+        "--exclude",
+        action="append",
+        default=None,
+        metavar="GLOB",
+        help="Glob pattern of files and directories to ignore, can be given multiple times",
+    )
+
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Convert all section files without using the section cache",
+    )
+
+    parser.add_argument(
+        "--clear-cache",
+        action="store_true",
+        help="Remove all entries from the section cache before converting",
+    )
+
+    parser.add_argument(
+        "--cache-size",
+        type=int,
+        default=None,
+        help="Size limit of the section cache in MB",
+    )
+
+    parser.add_argument(
+        "--watch",
+        action="store_true",
+        help="Regenerate the dtx whenever a resource file or template changes",
+    )
+
+    parser.add_argument(
+        "--profile",
+        type=Path,
+        default=None,
+        help="Time the conversion stages and save them as Chrome trace to the given file",
+    )
+
+    parser.add_argument(
+        "--profile-commands",
+        action="store_true",
+        help="Additionally record a span for every command when profiling",
+    )
+
+    parser.add_argument(
+        "--batch",
+        type=Path,
+        default=None,
+        help="Convert all packages listed in a JSON manifest or contained in a parent directory",
+    )
+
+    parser.add_argument(
+        "--lookup",
+        type=str,
+        default=None,
+        help="Print where the given macro is defined, using the symbol index of the target dir",
+    )
+
+    parser.add_argument(
+        "--check-refs",
+        action="store_true",
+        help="Report duplicate macros and dangling references from the symbol index",
+    )
+
+    parser.add_argument(
+        "--timeout",
+        type=float,
+        default=None,
+        help="Cancel the conversion of a package after the given number of seconds",
+    )
+
+    parser.add_argument(
+        "--max-commands",
+        type=int,
+        default=None,
+        help="Cancel the conversion of a package once it has more than the given commands",
+    )
+
+    parser.add_argument(
+        "--max-warnings",
+        type=int,
+        default=None,
+        help="Cancel the conversion of a package once it reported more than the given warnings",
+    )
+
+    parser.add_argument(
+        "--diagnostics",
+        type=Path,
+        default=None,
+        help="Save the warnings and errors of the conversion as JSON to the given file",
+    )
+
+    parser.add_argument(
+        "--check",
+        action="store_true",
+        help="Only parse and validate the section files, without writing anything",
+    )
+
+    parser.add_argument(
+        "--buffer-size",
+        type=int,
+        default=None,
+        help="Size of the buffers used to write the output file in KB",
+    )
+
+    parser.add_argument(
+        "--fsync",
+        action="store_true",
+        help="Flush the output file to the disk before it replaces the previous one",
+    )
+
+    parser.add_argument(
+        "--shards",
+        action="store_true",
+        help="Write every section into its own files that are included by the dtx",
+    )
+
+    parser.add_argument(
+        "--update",
+        action="store_true",
+        help="Only convert the changed sections and splice them into the existing dtx",
+    )
+
+    parser.add_argument(
+        "--json",
+        action="store_true",
+        help="Also write the parsed package as <pkg_name>.json",
+    )
+
+    parser.add_argument(
+        "--markdown",
+        action="store_true",
+        help="Also write an API reference of the package as <pkg_name>.md",
+    )
+
+    parser.add_argument(
+        "--serve",
+        action="store_true",
+        help="Run a local conversion server that keeps the converters of all packages warm",
+    )
+
+    parser.add_argument(
+        "--connect",
+        action="store_true",
+        help="Let the running conversion server convert the resource dir",
+    )
+
+    parser.add_argument(
+        "--render",
+        type=str,
+        default=None,
+        help="With --connect, print the converted fragments of the given section",
+    )
+
+    parser.add_argument(
+        "--stop-server",
+        action="store_true",
+        help="With --connect, stop the running conversion server",
+    )
+
+    parser.add_argument(
+        "--port",
+        type=int,
+        default=None,
+        help="Localhost port of the conversion server, used instead of the default socket",
+    )
+
+    parser.add_argument(
+        "--socket",
+        type=Path,
+        default=None,
+        help="Unix socket of the conversion server, used instead of the default socket",
+    )
+
+    parser.add_argument(
+        "--allow-dir",
+        type=Path,
+        action="append",
+        default=None,
+        metavar="DIR",
+        help="With --serve, directory the packages must be in, can be given multiple times, "
+        "defaults to the resource and target dir",
+    )
+
+    parser.add_argument(
+        "--stdin",
+        type=str,
+        default=None,
+        metavar="SECTION",
+        help="Convert one section file read from stdin and write its fragments to stdout",
+    )
+
     args = parser.parse_args()
 
-    if args.gui:
+    if args.jobs < 1:
+        parser.error("--jobs must be at least 1")
+    if args.timeout is not None and args.timeout <= 0:
+        parser.error("--timeout must be positive")
+    if args.max_commands is not None and args.max_commands < 0:
+        parser.error("--max-commands must not be negative")
+    if args.max_warnings is not None and args.max_warnings < 0:
+        parser.error("--max-warnings must not be negative")
+    if args.buffer_size is not None and args.buffer_size < 1:
+        parser.error("--buffer-size must be at least 1")
+    if args.update and (args.shards or args.json or args.markdown):
+        parser.error("--update can not be combined with --shards, --json or --markdown")
+    # Options of a single conversion in the console, the other modes would ignore them
+    console_options = [
+        "--" + name.replace("_", "-")
+        for name in [
+            "profile",
+            "profile_commands",
+            "check",
+            "check_refs",
+            "update",
+            "diagnostics",
+            "lookup",
+            "watch",
+        ]
+        if getattr(args, name) not in (None, False)
+    ]
+    modes = ["--" + name for name in ["batch", "serve", "gui"] if getattr(args, name)]
+    if console_options and modes:
+        parser.error(f"{', '.join(console_options)} can not be combined with {modes[0]}")
+
+    if args.stdin is not None:
+        from cli import convert_stdin
+
+        convert_stdin(args.stdin)
+    elif args.connect:
+        # The client does not import the converter, so it starts quickly
+        from client import run_client, server_address
+
+        address = server_address(args.port, args.socket)
+        dirs = {
+            "resource_dir": str(args.resource_dir.resolve()),
+            "target_dir": str(args.target_dir.resolve()),
+        }
+        if args.stop_server:
+            request = {"command": "shutdown"}
+        elif args.render is not None:
+            request = {"command": "render", "section": args.render, **dirs}
+        else:
+            request = {"command": "convert", **dirs}
+        if not run_client(address, request):
+            sys.exit(1)
+    elif args.serve:
+        from client import server_address
+        from server import ConversionServer
+
+        ConversionServer(
+            server_address(args.port, args.socket),
+            configure(args),
+            args.allow_dir or [args.resource_dir, args.target_dir],
+        ).serve()
+    elif args.gui:
         from gui.main_window import GuiApp
 
-        GuiApp(args.resource_dir, args.target_dir)
+        GuiApp(args.resource_dir, args.target_dir, args.jobs)
+    elif args.batch is not None:
+        from cli import BatchApp
+
+        batch_app = BatchApp(args.batch, configure(args))
+        if not batch_app.run():
+            sys.exit(1)
     else:
         from cli import CliApp
 
-        cli_app = CliApp(args.resource_dir, args.target_dir)
-        cli_app.run()
+        meta_info = configure(args)
+        meta_info.set_profiling(args.profile is not None, args.profile_commands)
+        cli_app = CliApp(
+            meta_info, profile=args.profile, update=args.update, diagnostics=args.diagnostics
+        )
+        if args.lookup is not None or args.check_refs:
+            found = args.lookup is None or cli_app.lookup(args.lookup)
+            checked = not args.check_refs or cli_app.check_refs()
+            if not (found and checked):
+                sys.exit(1)
+        elif args.check:
+            if not cli_app.check():
+                sys.exit(1)
+        elif args.watch:
+            cli_app.watch()
+        elif not cli_app.run():
+            sys.exit(1)
 
 
 if __name__ == "__main__":
+    # Required for the process pool when the application is run as a bundle
+    multiprocessing.freeze_support()
     main()
@@ -1,5 +1,13 @@
 from pathlib import Path
 
+from core.cache import DEFAULT_MAX_CACHE_SIZE
+from core.cancel import CancelToken
+from core.diagnostics import Diagnostics
+from core.discovery import DEFAULT_EXCLUDE
+from core.profiler import Profiler
+from core.progress import ProgressChannel
+from core.writer import DEFAULT_BUFFER_SIZE
+
 
 class MetaInformation:
     """Collection class for all kinds of metainformation and program settings."""
@@ -11,10 +19,52 @@ class MetaInformation:
         self.cur_file_count = 0
         self.max_file_count = 0
 
+        # Number of worker processes used to convert the section files
+        self.jobs = 1
+
+        # Glob patterns of the section files in the resource dir, None for the defaults
+        self.include: None | list[str] = None
+        self.exclude: None | list[str] = None
+
+        # Cache for the converted section files
+        self.use_cache = True
+        self.clear_cache = False
+        self.max_cache_size = DEFAULT_MAX_CACHE_SIZE
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+        # Writing of the output file
+        self.buffer_size = DEFAULT_BUFFER_SIZE
+        self.fsync = False
+        # Write every section into its own files that are included by the dtx
+        self.sharded = False
+        # Output backends besides the dtx, e.g. "json" or "markdown"
+        self.backends: list[str] = []
+
+        # Statistics of the last conversion
+        self.command_count = 0
+        self.output_file: None | Path = None
+        # Whether the output file was replaced, it is kept if the content did not change
+        self.output_rewritten = False
+
+        # Timings of the conversion stages
+        self.profiler = Profiler()
+
+        # Receives the progress of the conversion if set
+        self.progress: None | ProgressChannel = None
+
+        # Cancels the conversion on request or when it exceeds its limits if set
+        self.cancel: None | CancelToken = None
+
+        # Problems found by the last conversion, printed at its end
+        self.diagnostics = Diagnostics()
+
     def reset(self):
         self.finished = True
         self.cur_file_count = 0
         self.max_file_count = 0
+        self.cache_hits = 0
+        self.cache_misses = 0
 
     def incr_file_count(self):
         self.cur_file_count += 1
@@ -28,7 +78,68 @@ class MetaInformation:
     def get_max_file_count(self) -> int:
         return self.max_file_count
 
+    def set_jobs(self, jobs: int):
+        self.jobs = max(1, jobs)
+
+    def set_cache(self, use_cache: bool, clear_cache: bool = False, max_size: None | int = None):
+        self.use_cache = use_cache
+        self.clear_cache = clear_cache
+        if max_size is not None:
+            self.max_cache_size = max_size
+
+    def set_output(
+        self,
+        buffer_size: None | int = None,
+        fsync: bool = False,
+        sharded: bool = False,
+        backends: None | list[str] = None,
+    ):
+        if buffer_size is not None:
+            self.buffer_size = buffer_size
+        self.fsync = fsync
+        self.sharded = sharded
+        self.backends = [] if backends is None else list(dict.fromkeys(backends))
+
+    def set_profiling(self, enabled: bool, commands: bool = False):
+        self.profiler = Profiler(enabled, commands)
+
+    def set_progress(self, enabled: bool):
+        self.progress = ProgressChannel() if enabled else None
+
+    def set_limits(self, timeout: None | float = None, max_commands: None | int = None):
+        """Allow the conversion to be cancelled, optionally after a timeout or command count."""
+        self.cancel = CancelToken(timeout, max_commands)
+
+    def set_discovery(self, include: None | list[str] = None, exclude: None | list[str] = None):
+        """
+        Select the section files, the include patterns replace the default ones and the
+        exclude patterns are added to the default ones.
+        """
+        self.include = include
+        self.exclude = None if exclude is None else DEFAULT_EXCLUDE + exclude
+
+    def set_max_warnings(self, max_warnings: None | int):
+        """Cancel the conversion once it reported more warnings."""
+        self.diagnostics.max_warnings = max_warnings
+
     def set_dirs(self, rsc_dir: Path, tgt_dir: Path):
         """Set the source and target directories."""
         self.rsc_dir = rsc_dir
         self.tgt_dir = tgt_dir
+
+    def for_package(self, rsc_dir: Path, tgt_dir: Path) -> "MetaInformation":
+        """
+        New meta information with the settings of this one for another package. Profiling
+        and progress belong to a single run and are not taken over.
+        """
+        meta_info = MetaInformation()
+        meta_info.set_dirs(rsc_dir, tgt_dir)
+        meta_info.set_jobs(self.jobs)
+        meta_info.include = self.include
+        meta_info.exclude = self.exclude
+        meta_info.set_cache(self.use_cache, self.clear_cache, self.max_cache_size)
+        meta_info.set_output(self.buffer_size, self.fsync, self.sharded, self.backends)
+        meta_info.set_max_warnings(self.diagnostics.max_warnings)
+        if self.cancel is not None:
+            meta_info.set_limits(self.cancel.timeout, self.cancel.max_commands)
+        return meta_info
@@ -0,0 +1,196 @@
+import hmac
+import json
+import os
+import secrets
+import socket
+import socketserver
+import threading
+import time
+from concurrent.futures import Executor
+from pathlib import Path
+from typing import Any
+
+from client import ServerAddress, format_address, token_path
+from core.converter import Converter, worker_pool
+from core.writer import chunk_text
+from meta_information import MetaInformation
+
+
+class _TCPServer(socketserver.ThreadingTCPServer):
+    # Allow a restarted server to bind the port of its predecessor right away
+    allow_reuse_address = True
+    daemon_threads = True
+
+
+class ConversionServer:
+    """
+    Local server that keeps one resident converter per package, so repeated conversions reuse
+    the compiled templates, the converted sections and the worker processes.
+
+    Requests are JSON objects, one per line, with a "command" of
+    - "convert": convert "resource_dir" into "target_dir"
+    - "render": convert the "section" of "resource_dir" and return its fragments
+    Both return the diagnostics of the conversion.
+    - "shutdown": stop the server
+    Every response contains an "error" that is None on success and the "duration" in seconds.
+
+    A Unix socket is only accessible by the user. A TCP port can be reached by every local
+    user, so requests to it must contain the "token" the server writes to a file only the
+    user can read. Packages are only converted within the allowed root directories.
+    """
+
+    def __init__(self, address: ServerAddress, meta_info: MetaInformation, roots: list[Path]):
+        """The settings of the meta information apply to the converters of all packages."""
+        self.address = address
+        self.meta_info = meta_info
+        self.jobs = meta_info.jobs
+        self.roots = [root.resolve() for root in roots]
+        # Required in the requests to a TCP server
+        self.token: None | str = None
+
+        self.executor: None | Executor = None
+        # Converters by resource and target dir, each with a lock serializing its runs
+        self.packages: dict[tuple[Path, Path], tuple[Converter, threading.Lock]] = {}
+        self._packages_lock = threading.Lock()
+        self._server: None | socketserver.BaseServer = None
+
+    def serve(self):
+        """Handle requests until the server is shut down or interrupted."""
+        if self.jobs > 1:
+            # Packages are converted concurrently and can not share the cancellation event
+            # of the workers, they only enforce the limits
+            self.executor = worker_pool(self.jobs)
+        self._server = self._create_server()
+        if not isinstance(self.address, str):
+            self.token = secrets.token_urlsafe(32)
+            _write_private(token_path(self.address), self.token)
+        print(f"Conversion server listening on {format_address(self.address)}.")
+        try:
+            self._server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self._server.server_close()
+            if isinstance(self.address, str):
+                Path(self.address).unlink(missing_ok=True)
+            else:
+                token_path(self.address).unlink(missing_ok=True)
+            if self.executor is not None:
+                self.executor.shutdown(cancel_futures=True)
+        print("Stopped the conversion server.")
+
+    def handle(self, request: dict[str, Any]) -> dict[str, Any]:
+        start = time.perf_counter()
+        if self.token is not None and not hmac.compare_digest(
+            str(request.get("token", "")).encode("utf-8"), self.token.encode("utf-8")
+        ):
+            return {"error": "Invalid token.", "duration": time.perf_counter() - start}
+        try:
+            command = request.get("command")
+            if command == "convert":
+                response = self.convert(request)
+            elif command == "render":
+                response = self.render(request)
+            elif command == "shutdown":
+                response = {}
+                if self._server is not None:
+                    # shutdown waits for serve_forever, which waits for this request
+                    threading.Thread(target=self._server.shutdown).start()
+            else:
+                raise ValueError(f"Unknown command {command}.")
+        except Exception as e:
+            response = {"error": str(e) or type(e).__name__}
+        response.setdefault("error", None)
+        response["duration"] = time.perf_counter() - start
+        return response
+
+    def convert(self, request: dict[str, Any]) -> dict[str, Any]:
+        converter, lock = self.package(Path(request["resource_dir"]), Path(request["target_dir"]))
+        meta_info = converter.meta_info
+        with lock:
+            meta_info.tgt_dir.mkdir(parents=True, exist_ok=True)
+            converter.execute()
+            return {
+                "output_file": str(meta_info.output_file),
+                "rewritten": meta_info.output_rewritten,
+                "commands": meta_info.command_count,
+                "cache_hits": meta_info.cache_hits,
+                "cache_misses": meta_info.cache_misses,
+                "diagnostics": meta_info.diagnostics.entries,
+            }
+
+    def render(self, request: dict[str, Any]) -> dict[str, Any]:
+        converter, lock = self.package(Path(request["resource_dir"]), Path(request["target_dir"]))
+        with lock:
+            fragments = converter.convert_section(request["section"])
+        return {
+            "section": request["section"],
+            "docu": chunk_text(fragments["docu"]),
+            "impl": chunk_text(fragments["impl"]),
+            "commands": fragments["commands"],
+            "diagnostics": fragments["diagnostics"],
+        }
+
+    def package(self, rsc_dir: Path, tgt_dir: Path) -> tuple[Converter, threading.Lock]:
+        """The resident converter of the package, created on its first request."""
+        key = (rsc_dir.resolve(), tgt_dir.resolve())
+        for path in key:
+            if not any(path.is_relative_to(root) for root in self.roots):
+                raise PermissionError(f"{path} is outside of the allowed directories.")
+        with self._packages_lock:
+            if key not in self.packages:
+                meta_info = self.meta_info.for_package(*key)
+                converter = Converter(meta_info, resident=True, executor=self.executor)
+                self.packages[key] = (converter, threading.Lock())
+            return self.packages[key]
+
+    def _create_server(self) -> socketserver.BaseServer:
+        app = self
+
+        class RequestHandler(socketserver.StreamRequestHandler):
+            def handle(self):
+                for line in self.rfile:
+                    try:
+                        request = json.loads(line)
+                    except json.JSONDecodeError as e:
+                        response = {"error": f"Invalid request: {e}", "duration": 0.0}
+                    else:
+                        response = app.handle(request)
+                    self.wfile.write(json.dumps(response).encode("utf-8") + b"\n")
+                    self.wfile.flush()
+
+        if isinstance(self.address, str):
+            Path(self.address).parent.mkdir(mode=0o700, parents=True, exist_ok=True)
+            _remove_stale_socket(self.address)
+            # The socket is created without any access for others
+            umask = os.umask(0o177)
+            try:
+                unix_server = socketserver.ThreadingUnixStreamServer(self.address, RequestHandler)
+            finally:
+                os.umask(umask)
+            unix_server.daemon_threads = True
+            return unix_server
+
+        return _TCPServer(self.address, RequestHandler)
+
+
+def _write_private(path: Path, text: str):
+    """Write a new file only the user can read, replacing an existing one."""
+    path.parent.mkdir(mode=0o700, parents=True, exist_ok=True)
+    path.unlink(missing_ok=True)
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    with open(fd, "w", encoding="utf-8") as f:
+        f.write(text)
+
+
+def _remove_stale_socket(path: str):
+    """Remove the socket file of a server that did not shut down, fails if it still runs."""
+    if not os.path.exists(path):
+        return
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as probe:
+        try:
+            probe.connect(path)
+        except ConnectionRefusedError:
+            os.unlink(path)
+            return
+    raise OSError(f"A conversion server is already running at {path}.")